@@ -0,0 +1,330 @@
+import asyncio
+import base64
+import io
+import json
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from google import genai
+from google.genai import types
+from PIL import Image
+
+# Bulk-tier state in Redis:
+#   bulk:pending:{stage}  -> list of job ids waiting to go into a batch
+#   bulk:inflight:{stage} -> job ids taken by the collector, not yet in a batch
+#   bulk:job:{job_id}     -> hash with the job's inputs, options and story
+#   bulk:batches          -> set of submitted batch names still being polled
+#   bulk:batch:{name}     -> hash with the batch's stage and job ids
+# Job status and events still go through the regular event log.
+STAGES = ("story", "image")
+BATCHES_KEY = "bulk:batches"
+COLLECT_LOCK_KEY = "bulk:lock:collect"
+# Batches can take up to a day per stage, so bulk jobs outlive the event TTL;
+# the poller keeps their events alive for as long as a batch is running
+BULK_JOB_TTL_SECONDS = 3 * 86400
+# Longer than the cron timeout, so a crashed collector or poller never
+# blocks the queue for good
+BATCH_LOCK_SECONDS = 3600
+
+
+def pending_key(stage: str) -> str:
+    return f"bulk:pending:{stage}"
+
+
+def inflight_key(stage: str) -> str:
+    return f"bulk:inflight:{stage}"
+
+
+def bulk_job_key(job_id: str) -> str:
+    return f"bulk:job:{job_id}"
+
+
+def batch_key(name: str) -> str:
+    return f"bulk:batch:{name}"
+
+
+def _decode(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+class BatchFailed(Exception):
+    pass
+
+
+class BulkJobStore:
+    """
+    Redis-backed queue of bulk jobs and the batches they have been put in.
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def add(self, job_id: str, images_urls: List[str], options: dict):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hset(bulk_job_key(job_id), mapping={
+            "images_urls": json.dumps(images_urls),
+            "options": json.dumps(options),
+        })
+        pipe.expire(bulk_job_key(job_id), BULK_JOB_TTL_SECONDS)
+        pipe.rpush(pending_key("story"), job_id)
+        await pipe.execute()
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        raw = await self.redis.hgetall(bulk_job_key(job_id))
+        if not raw:
+            return None
+        data = {_decode(k): _decode(v) for k, v in raw.items()}
+        return {
+            "images_urls": json.loads(data["images_urls"]),
+            "options": json.loads(data["options"]),
+            "story": data.get("story"),
+        }
+
+    async def take_pending(self, stage: str, limit: int) -> List[str]:
+        """
+        Moves up to `limit` job ids from the pending list to the in-flight
+        list. They stay there until they are recorded in a batch, dropped or
+        requeued, so a collector that dies in between never loses them.
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for _ in range(limit):
+            pipe.lmove(pending_key(stage), inflight_key(stage), "LEFT", "RIGHT")
+        job_ids = await pipe.execute()
+        return [_decode(job_id) for job_id in job_ids if job_id is not None]
+
+    async def drop_inflight(self, stage: str, job_ids: List[str]):
+        if job_ids:
+            pipe = self.redis.pipeline(transaction=False)
+            for job_id in job_ids:
+                pipe.lrem(inflight_key(stage), 1, job_id)
+            await pipe.execute()
+
+    async def requeue(self, stage: str, job_ids: List[str]):
+        if job_ids:
+            pipe = self.redis.pipeline(transaction=True)
+            for job_id in job_ids:
+                pipe.lrem(inflight_key(stage), 1, job_id)
+            pipe.lpush(pending_key(stage), *reversed(job_ids))
+            await pipe.execute()
+
+    async def recover_inflight(self, stage: str) -> int:
+        """
+        Puts job ids left in flight by a collector that died back at the front
+        of the pending list, in their original order. Only safe while holding
+        the collector lock. Returns how many were recovered.
+        """
+        recovered = 0
+        while await self.redis.lmove(inflight_key(stage), pending_key(stage), "RIGHT", "LEFT"):
+            recovered += 1
+        return recovered
+
+    async def count_submit_failure(self, stage: str, job_ids: List[str]) -> List[int]:
+        """
+        Counts a failed batch submission against each job. Returns how many
+        times each job's stage has failed to submit so far.
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for job_id in job_ids:
+            pipe.hincrby(bulk_job_key(job_id), f"submit_failures:{stage}", 1)
+        return await pipe.execute()
+
+    async def set_story(self, job_id: str, story: str) -> bool:
+        """
+        Records the job's story and queues it for the image stage. Returns
+        False if the story was already recorded, so a re-polled batch never
+        queues a job twice.
+        """
+        if not await self.redis.hsetnx(bulk_job_key(job_id), "story", story):
+            return False
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.expire(bulk_job_key(job_id), BULK_JOB_TTL_SECONDS)
+        pipe.rpush(pending_key("image"), job_id)
+        await pipe.execute()
+        return True
+
+    async def finish_job(self, job_id: str):
+        await self.redis.delete(bulk_job_key(job_id))
+
+    async def add_batch(self, name: str, stage: str, job_ids: List[str]):
+        # Recording the batch and releasing its jobs from flight go together
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.hset(batch_key(name), mapping={
+            "stage": stage,
+            "job_ids": json.dumps(job_ids),
+            "submitted_at": repr(time.time()),
+        })
+        pipe.expire(batch_key(name), BULK_JOB_TTL_SECONDS)
+        pipe.sadd(BATCHES_KEY, name)
+        for job_id in job_ids:
+            pipe.lrem(inflight_key(stage), 1, job_id)
+        await pipe.execute()
+
+    async def batches(self) -> List[str]:
+        return sorted(_decode(name) for name in await self.redis.smembers(BATCHES_KEY))
+
+    async def get_batch(self, name: str) -> Optional[dict]:
+        raw = await self.redis.hgetall(batch_key(name))
+        if not raw:
+            return None
+        data = {_decode(k): _decode(v) for k, v in raw.items()}
+        return {
+            "stage": data["stage"],
+            "job_ids": json.loads(data["job_ids"]),
+            "submitted_at": float(data["submitted_at"]),
+        }
+
+    async def finish_batch(self, name: str):
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.srem(BATCHES_KEY, name)
+        pipe.delete(batch_key(name))
+        await pipe.execute()
+
+    async def lock_batch(self, name: str) -> bool:
+        return bool(await self.redis.set(f"bulk:lock:{name}", "1", nx=True, ex=BATCH_LOCK_SECONDS))
+
+    async def unlock_batch(self, name: str):
+        await self.redis.delete(f"bulk:lock:{name}")
+
+    async def lock_collector(self) -> bool:
+        return bool(await self.redis.set(COLLECT_LOCK_KEY, "1", nx=True, ex=BATCH_LOCK_SECONDS))
+
+    async def unlock_collector(self):
+        await self.redis.delete(COLLECT_LOCK_KEY)
+
+
+def request_line(key: str, parts: List[dict], generation_config: Optional[dict] = None) -> dict:
+    """
+    One line of a batch input file: a keyed GenerateContentRequest in JSON form.
+    """
+    request = {"contents": [{"role": "user", "parts": parts}]}
+    if generation_config:
+        request["generation_config"] = generation_config
+    return {"key": key, "request": request}
+
+
+def image_part(path: Path) -> dict:
+    with Image.open(path) as img:
+        mime_type = Image.MIME.get(img.format, "image/png")
+    data = base64.b64encode(path.read_bytes()).decode("ascii")
+    return {"inline_data": {"mime_type": mime_type, "data": data}}
+
+
+def _response_parts(response: dict) -> List[dict]:
+    candidates = response.get("candidates") or []
+    if not candidates:
+        return []
+    return (candidates[0].get("content") or {}).get("parts") or []
+
+
+def response_text(response: dict) -> str:
+    return "".join(part.get("text", "") for part in _response_parts(response) if not part.get("thought"))
+
+
+def response_image(response: dict) -> Optional[bytes]:
+    # Batch output is proto JSON, which may use either field naming
+    for part in _response_parts(response):
+        inline = part.get("inlineData") or part.get("inline_data")
+        if inline and inline.get("data"):
+            return base64.b64decode(inline["data"])
+    return None
+
+
+def _iter_lines(data: bytes) -> Iterator[dict]:
+    for line in io.BytesIO(data):
+        if line.strip():
+            yield json.loads(line)
+
+
+class GeminiBatchBackend:
+    """
+    Gemini batch prediction: requests are uploaded as a JSONL file and
+    results come back as one, at batch pricing and outside the interactive
+    quota.
+    """
+
+    FAILED_STATES = {"JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+    def __init__(self, client: genai.Client):
+        self.client = client
+
+    async def submit(self, model: str, requests_path: Path, display_name: str) -> str:
+        uploaded = await self.client.aio.files.upload(
+            file=str(requests_path),
+            config=types.UploadFileConfig(display_name=display_name, mime_type="jsonl"),
+        )
+        batch = await self.client.aio.batches.create(
+            model=model,
+            src=uploaded.name,
+            config=types.CreateBatchJobConfig(display_name=display_name),
+        )
+        return batch.name
+
+    async def poll(self, name: str) -> Optional[List[dict]]:
+        """
+        Returns the output lines once the batch has succeeded, or None while
+        it is still running. Raises BatchFailed if it ended any other way.
+        """
+        batch = await self.client.aio.batches.get(name=name)
+        state = batch.state.name if batch.state else None
+        if state in self.FAILED_STATES:
+            raise BatchFailed(f"Batch {name} ended in {state}: {batch.error.message if batch.error else 'no details'}")
+        if state != "JOB_STATE_SUCCEEDED":
+            return None
+        data = await asyncio.to_thread(self.client.files.download, file=batch.dest.file_name)
+        return list(_iter_lines(data))
+
+    async def discard(self, name: str):
+        # Batch jobs and their files expire on Gemini's side
+        pass
+
+
+class LocalBatchBackend:
+    """
+    Stand-in for the batch endpoint, for tests and local runs. Batches are
+    kept on disk and "succeed" `delay` seconds after submission with a canned
+    story and a flat placeholder image for every request.
+    """
+
+    def __init__(self, directory: Path, delay: float = 5.0):
+        self.directory = directory
+        self.delay = delay
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    async def submit(self, model: str, requests_path: Path, display_name: str) -> str:
+        name = f"batches/local-{uuid.uuid4().hex}"
+        path = self.directory / name.split("/")[-1]
+        await asyncio.to_thread(shutil.copyfile, requests_path, path.with_suffix(".jsonl"))
+        meta = {"model": model, "display_name": display_name, "submitted_at": time.time()}
+        path.with_suffix(".json").write_text(json.dumps(meta), encoding="utf-8")
+        return name
+
+    def _respond(self, line: dict) -> dict:
+        request = line["request"]
+        image_config = (request.get("generation_config") or {}).get("image_config")
+        if image_config is None:
+            parts = [{"text": f"A local batch story for {line['key']}."}]
+        else:
+            width, height = (int(n) for n in image_config.get("aspect_ratio", "1:1").split(":"))
+            buf = io.BytesIO()
+            Image.new("RGB", (width * 32, height * 32), (128, 128, 128)).save(buf, format="PNG")
+            parts = [{"inlineData": {"mimeType": "image/png", "data": base64.b64encode(buf.getvalue()).decode("ascii")}}]
+        return {"key": line["key"], "response": {"candidates": [{"content": {"role": "model", "parts": parts}}]}}
+
+    async def poll(self, name: str) -> Optional[List[dict]]:
+        path = self.directory / name.split("/")[-1]
+        meta_path = path.with_suffix(".json")
+        if not meta_path.exists():
+            raise BatchFailed(f"Batch {name} not found")
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if time.time() - meta["submitted_at"] < self.delay:
+            return None
+        data = await asyncio.to_thread(path.with_suffix(".jsonl").read_bytes)
+        return [self._respond(line) for line in _iter_lines(data)]
+
+    async def discard(self, name: str):
+        path = self.directory / name.split("/")[-1]
+        path.with_suffix(".json").unlink(missing_ok=True)
+        path.with_suffix(".jsonl").unlink(missing_ok=True)
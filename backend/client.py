@@ -1,14 +1,16 @@
+import asyncio
 import os
-import time
-import requests
 from pathlib import Path
 from typing import List, Optional
 import typer
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn
-from PIL import Image
 from dotenv import load_dotenv
 
+from panel_one_client import PanelOneClient
+from scanner import MAX_IMAGES, ScanCache, scan_images, watch_albums
+from schemas import JobResponse
+
 # Load env
 load_dotenv()
 API_URL = os.getenv("API_URL", "http://localhost:8080")
@@ -16,135 +18,151 @@ API_URL = os.getenv("API_URL", "http://localhost:8080")
 app = typer.Typer()
 console = Console()
 
-def validate_images(directory: Path) -> List[Path]:
+RESULT_NAME = "panel_one_result.png"
+
+def validate_images(directory: Path, cache: Optional[ScanCache] = None) -> List[Path]:
     """
     Scans the directory for images, validates them with Pillow, 
-    and returns a list of valid image paths.
+    and returns a list of up to 8 valid image paths.
+    """
+    def _warn(path: Path, error: str):
+        console.print(f"[yellow]Warning: Could not open {path.name}: {error}, skipping.[/yellow]")
+
+    return scan_images(directory, limit=MAX_IMAGES, cache=cache, on_invalid=_warn)
+
+STATUS_DESCRIPTIONS = {
+    "QUEUED": "Queued...",
+    "PROCESSING_IMAGES": "Processing images...",
+    "GENERATING_STORY": "Generating story...",
+    "GENERATING_IMAGE": "Generating panel image...",
+    "UPLOADING": "Uploading result...",
+    "COMPLETED": "Job completed!",
+}
+
+async def run_albums(directories: List[Path], albums: List[List[Path]], concurrency: int, preview: bool, tier: str):
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        console=console
+    ) as progress:
+        tasks = [
+            progress.add_task(f"{d.name}: Uploading images and submitting job...", total=None)
+            for d in directories
+        ]
+
+        def on_update(index: int, job: JobResponse):
+            description = STATUS_DESCRIPTIONS.get(job.status.value, f"Status: {job.status.value}")
+            progress.update(tasks[index], description=f"{directories[index].name}: {description}")
+
+        async with PanelOneClient(API_URL) as client:
+            results = await client.run_many(
+                [(images, d / RESULT_NAME) for d, images in zip(directories, albums)],
+                concurrency=concurrency,
+                on_update=on_update,
+                preview=preview,
+                tier=tier,
+            )
+
+        for task, d, result in zip(tasks, directories, results):
+            if isinstance(result, BaseException):
+                progress.update(task, completed=1, description=f"[red]{d.name}: {result}[/red]")
+            else:
+                progress.update(task, completed=1, description=f"[green]{d.name}: Saved to {result.output_path}[/green]")
+    return results
+
+async def watch_root(root: Path, concurrency: int, preview: bool, tier: str):
+    """
+    Submits every new album folder that appears under root, forever.
+    Folders that already have a result are skipped.
     """
-    valid_images = []
-    extensions = {'.jpg', '.jpeg', '.png', '.webp'}
-    if not directory.exists():
-        return []
-        
-    files = sorted([f for f in directory.iterdir() if f.is_file() and f.suffix.lower() in extensions])
-    
-    for f in files:
+    cache = ScanCache()
+    semaphore = asyncio.Semaphore(concurrency)
+    running = set()
+
+    async def _run(client: PanelOneClient, album: Path, images: List[Path]):
         try:
-            with Image.open(f) as img:
-                img.verify()
-            valid_images.append(f)
+            result = await client.run(images, album / RESULT_NAME, preview=preview, tier=tier)
+            console.print(f"[green]{album.name}: Saved to {result.output_path}[/green]")
         except Exception as e:
-            console.print(f"[yellow]Warning: Could not open {f.name}: {e}, skipping.[/yellow]")
-            continue
-            
-    return valid_images[:8]
+            console.print(f"[red]{album.name}: {e}[/red]")
+        finally:
+            semaphore.release()
+
+    console.print(f"Watching {root} for new albums...")
+    async with PanelOneClient(API_URL) as client:
+        async for album in watch_albums(root, skip=lambda a: (a / RESULT_NAME).exists()):
+            images = await asyncio.to_thread(validate_images, album, cache)
+            cache.save()
+            if not images:
+                console.print(f"[yellow]No valid images found in {album}, skipping.[/yellow]")
+                continue
+            console.print(f"{album.name}: submitting {len(images)} images")
+            # Wait for a free slot so a burst of new folders can't overload the API
+            await semaphore.acquire()
+            task = asyncio.create_task(_run(client, album, images))
+            running.add(task)
+            task.add_done_callback(running.discard)
 
 @app.command()
-def main(directory: Path = typer.Option(..., "--dir", help="Directory containing images")):
+def main(
+    directories: List[Path] = typer.Option([], "--dir", help="Directory containing images (repeatable)"),
+    watch: Optional[Path] = typer.Option(None, "--watch", help="Drop folder: submit each new album subdirectory as it appears"),
+    concurrency: int = typer.Option(4, "--concurrency", help="Maximum number of jobs in flight"),
+    preview: bool = typer.Option(False, "--preview", help="Request a low-resolution preview tier"),
+    bulk: bool = typer.Option(False, "--bulk", help="Submit as low-priority bulk jobs (batched; may take hours)"),
+):
     """
     Panel One Backend Client
     """
-    if not directory.exists() or not directory.is_dir():
-        console.print(f"[red]Error: Directory {directory} does not exist.[/red]")
+    tier = "bulk" if bulk else "interactive"
+    if watch:
+        if not watch.is_dir():
+            console.print(f"[red]Error: Directory {watch} does not exist.[/red]")
+            raise typer.Exit(code=1)
+        try:
+            asyncio.run(watch_root(watch, concurrency, preview, tier))
+        except KeyboardInterrupt:
+            console.print("[yellow]Stopped watching.[/yellow]")
+        return
+
+    if not directories:
+        console.print("[red]Error: pass --dir or --watch.[/red]")
         raise typer.Exit(code=1)
 
+    for directory in directories:
+        if not directory.exists() or not directory.is_dir():
+            console.print(f"[red]Error: Directory {directory} does not exist.[/red]")
+            raise typer.Exit(code=1)
+
     # 1. Validate Images
-    console.print(f"Scanning {directory}...")
-    images = validate_images(directory)
-    if not images:
-        console.print("[red]No valid images found in directory.[/red]")
+    cache = ScanCache()
+    valid_dirs, albums = [], []
+    for directory in directories:
+        console.print(f"Scanning {directory}...")
+        images = validate_images(directory, cache)
+        if not images:
+            console.print(f"[yellow]No valid images found in {directory}, skipping.[/yellow]")
+            continue
+        console.print(f"[green]Found {len(images)} valid images.[/green]")
+        valid_dirs.append(directory)
+        albums.append(images)
+
+    cache.save()
+    if not albums:
+        console.print("[red]No valid images found.[/red]")
         raise typer.Exit(code=1)
-    
-    console.print(f"[green]Found {len(images)} valid images.[/green]")
 
-    # 2. Submit Job
-    files = []
-    opened_files = []
+    # 2. Submit, track and download all jobs concurrently
     try:
-        for img_path in images:
-            f = open(img_path, "rb")
-            opened_files.append(f)
-            # requests expects ('field_name', (filename, file_obj, content_type))
-            files.append(('images', (img_path.name, f, f"image/{img_path.suffix[1:]}")))
-
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            console=console
-        ) as progress:
-            task_submit = progress.add_task("Uploading images and submitting job...", total=None)
-            
-            try:
-                response = requests.post(f"{API_URL}/generate", files=files)
-                response.raise_for_status()
-                job_data = response.json()
-                job_id = job_data["job_id"]
-                progress.update(task_submit, completed=1, description="Job submitted successfully.")
-            except Exception as e:
-                progress.update(task_submit, completed=1, description="[red]Failed to submit job.[/red]")
-                console.print(f"[red]Error: {e}[/red]")
-                raise typer.Exit(code=1)
-
-            # 3. Poll Status
-            task_status = progress.add_task("Waiting for worker...", total=None)
-            
-            while True:
-                try:
-                    resp = requests.get(f"{API_URL}/job/{job_id}")
-                    resp.raise_for_status()
-                    data = resp.json()
-                    status = data["status"]
-                    
-                    # Update description based on status
-                    description = f"Status: {status}"
-                    if status == "QUEUED":
-                        description = "Queued..."
-                    elif status == "PROCESSING_IMAGES":
-                        description = "Processing images..."
-                    elif status == "GENERATING_STORY":
-                        description = "Generating story..."
-                    elif status == "GENERATING_IMAGE":
-                        description = "Generating panel image..."
-                    elif status == "UPLOADING":
-                        description = "Uploading result..."
-                    
-                    progress.update(task_status, description=description)
-                    
-                    if status == "COMPLETED":
-                        progress.update(task_status, completed=1, description="Job completed!")
-                        result_url = data.get("result_url")
-                        break
-                    elif status == "FAILED":
-                        error_msg = data.get("error_message", "Unknown error")
-                        progress.update(task_status, completed=1, description=f"[red]Job failed: {error_msg}[/red]")
-                        raise typer.Exit(code=1)
-                    
-                    time.sleep(1)
-                except KeyboardInterrupt:
-                    console.print("[yellow]Cancelled by user.[/yellow]")
-                    raise typer.Exit(code=1)
-                except Exception as e:
-                    # Ignore transient network errors?
-                    pass
-                    time.sleep(1)
-
-    finally:
-        for f in opened_files:
-            f.close()
-
-    # 4. Download Result
-    if result_url:
-        console.print(f"[green]Result URL: {result_url}[/green]")
-        try:
-            local_path = directory / "panel_one_result.png"
-            console.print(f"Downloading to {local_path}...")
-            r = requests.get(result_url)
-            r.raise_for_status()
-            with open(local_path, "wb") as f:
-                f.write(r.content)
-            console.print(f"[green]Saved to {local_path}[/green]")
-        except Exception as e:
-            console.print(f"[red]Failed to download result: {e}[/red]")
+        results = asyncio.run(run_albums(valid_dirs, albums, concurrency, preview, tier))
+    except KeyboardInterrupt:
+        console.print("[yellow]Cancelled by user.[/yellow]")
+        raise typer.Exit(code=1)
+
+    failed = [r for r in results if isinstance(r, BaseException)]
+    console.print(f"{len(results) - len(failed)} completed, {len(failed)} failed.")
+    if failed:
+        raise typer.Exit(code=1)
 
 if __name__ == "__main__":
     app()
@@ -1,6 +1,6 @@
 import os
 from pathlib import Path
-from typing import Optional
+from typing import Literal, Optional
 from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
@@ -9,12 +9,58 @@ load_dotenv()
 
 class Settings(BaseSettings):
     GEMINI_API_KEY: str
-    PROJECT_ID: str
+    # Only needed for GCS storage
+    PROJECT_ID: Optional[str] = None
     BUCKET_NAME: str = "panel-one-outputs"
     REDIS_URL: str = "redis://localhost:6379"
     API_URL: str = "http://localhost:8080"
     GOOGLE_APPLICATION_CREDENTIALS: Optional[str] = None
     PORT: int = 8080
+    # Embedded single-node mode: the API runs jobs in-process, no Redis or arq worker
+    EMBEDDED_MODE: bool = False
+    EMBEDDED_CONCURRENCY: int = 2
+    EMBEDDED_QUEUE_SIZE: int = 100
+    # "gcs" or "local"; local files are served by the API under /files
+    STORAGE_BACKEND: Literal["gcs", "local"] = "gcs"
+    LOCAL_STORAGE_DIR: str = "data"
+    # Largest single input image accepted by POST /generate
+    MAX_IMAGE_BYTES: int = 20 * 1024 * 1024
+    # Shared inputs unused for this long are deleted (bucket lifecycle / local sweep)
+    INPUT_RETENTION_DAYS: int = 7
+    # Worker-side on-disk LRU of downloaded inputs, keyed by content hash. On
+    # Cloud Run /tmp is in memory, so this counts against the worker's --memory
+    INPUT_CACHE_DIR: str = "/tmp/panel-one-inputs"
+    INPUT_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    # Bulk tier (tier=bulk): "gemini" uses the batch prediction API, "local"
+    # a stand-in that completes batches after BULK_LOCAL_BATCH_DELAY seconds
+    BULK_BATCH_BACKEND: Literal["gemini", "local"] = "gemini"
+    # Batch results are downloaded whole, so this bounds worker memory
+    BULK_BATCH_MAX_JOBS: int = 50
+    # Batches are also cut by request file size. Each line inlines a job's
+    # images base64-encoded, the Files API takes at most 2 GB, and the file is
+    # written under /tmp (in memory on Cloud Run)
+    BULK_BATCH_MAX_BYTES: int = 512 * 1024 * 1024
+    # A job whose batch fails to submit this many times per stage is failed
+    BULK_SUBMIT_MAX_ATTEMPTS: int = 3
+    BULK_COLLECT_INTERVAL_MINUTES: int = 10
+    BULK_LOCAL_BATCH_DIR: str = "data/batches"
+    BULK_LOCAL_BATCH_DELAY: float = 5.0
+    # Concurrent /ws subscribers per API instance; each holds one Redis connection
+    WS_MAX_SUBSCRIBERS: int = 500
+    # In-memory LRU of hot results served by GET /result/{job_id}. The API
+    # runs with Cloud Run's default 512 MiB, shared with ingest temp files
+    RESULT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # "queue" renders and writes logs on a background thread; "sync" writes inline
+    LOG_MODE: Literal["sync", "queue"] = "queue"
+    LOG_QUEUE_SIZE: int = 10000
+    # At most this many INFO/DEBUG events per logger and event per window
+    LOG_SAMPLE_BURST: int = 50
+    LOG_SAMPLE_WINDOW: float = 1.0
+    LOG_STATS_INTERVAL: float = 60.0
+    # Model call layer (see model_calls.py)
+    GEMINI_MAX_ATTEMPTS: int = 3
+    # Send a duplicate story request when the first exceeds the observed p95
+    GEMINI_HEDGE_STORY: bool = False
 
     @field_validator("REDIS_URL")
     def validate_redis_url(cls, v):
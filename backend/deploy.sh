@@ -11,6 +11,12 @@ else
     set +a
 fi
 
+# scanner.py is shared with script/; refuse to deploy copies that have drifted
+if [ -f ../script/scanner.py ] && ! cmp -s scanner.py ../script/scanner.py; then
+    echo "Error: backend/scanner.py and script/scanner.py differ. Keep both copies identical."
+    exit 1
+fi
+
 # Function to update secret
 update_secret() {
     local name=$1
@@ -0,0 +1,96 @@
+import asyncio
+import io
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from PIL import Image, ImageOps, features
+
+from storage import upload_bytes
+from utils import logger
+
+# Results are written once under a per-job path and never change.
+RESULT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+THUMBNAIL_MAX_SIZE = (640, 640)
+SOCIAL_CARD_SIZE = (1200, 630)
+
+
+@dataclass(frozen=True)
+class Derivative:
+    name: str
+    extension: str
+    content_type: str
+    render: Callable[[Image.Image], bytes]
+
+
+def _encode(img: Image.Image, format: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+
+def _full_webp(img: Image.Image) -> bytes:
+    return _encode(img, "WEBP", quality=85, method=4)
+
+
+def _full_avif(img: Image.Image) -> bytes:
+    return _encode(img, "AVIF", quality=60)
+
+
+def _thumbnail(img: Image.Image) -> bytes:
+    img.thumbnail(THUMBNAIL_MAX_SIZE)
+    return _encode(img, "WEBP", quality=80, method=4)
+
+
+def _social_card(img: Image.Image) -> bytes:
+    # Social platforms are inconsistent about WebP for link previews, so the
+    # card is a JPEG cropped to the common 1.91:1 size.
+    card = ImageOps.fit(img.convert("RGB"), SOCIAL_CARD_SIZE)
+    return _encode(card, "JPEG", quality=85, optimize=True, progressive=True)
+
+
+DERIVATIVES = [
+    Derivative("webp", "webp", "image/webp", _full_webp),
+    Derivative("avif", "avif", "image/avif", _full_avif),
+    Derivative("thumbnail", "webp", "image/webp", _thumbnail),
+    Derivative("social", "jpg", "image/jpeg", _social_card),
+]
+
+
+def _supported(derivative: Derivative) -> bool:
+    # AVIF needs a Pillow build with libavif
+    if derivative.extension == "avif":
+        return features.check("avif")
+    return True
+
+
+def _render(image_bytes: bytes, derivative: Derivative) -> bytes:
+    # Each render decodes its own copy: Pillow images are not safe to share
+    # between threads.
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        return derivative.render(img.convert("RGB"))
+
+
+async def _publish_derivative(job_id: str, image_bytes: bytes, derivative: Derivative) -> Optional[str]:
+    try:
+        data = await asyncio.to_thread(_render, image_bytes, derivative)
+        return await upload_bytes(
+            data,
+            f"outputs/{job_id}/panel_{derivative.name}.{derivative.extension}",
+            content_type=derivative.content_type,
+            cache_control=RESULT_CACHE_CONTROL,
+        )
+    except Exception as e:
+        logger.warning("Failed to publish derivative", job_id=job_id, derivative=derivative.name, error=str(e))
+        return None
+
+
+async def publish_derivatives(job_id: str, image_bytes: bytes) -> Dict[str, str]:
+    """
+    Renders and uploads size-optimized variants of the result in parallel.
+    Returns a mapping of derivative name to public URL; failed variants are
+    left out rather than failing the job.
+    """
+    derivatives = [d for d in DERIVATIVES if _supported(d)]
+    urls = await asyncio.gather(*[_publish_derivative(job_id, image_bytes, d) for d in derivatives])
+    return {d.name: url for d, url in zip(derivatives, urls) if url}
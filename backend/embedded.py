@@ -0,0 +1,57 @@
+import asyncio
+from typing import List, Optional
+
+from events import MemoryJobEventLog
+from schemas import JobStatus
+from utils import logger
+from worker import JOB_TIMEOUT, generate_panel, shutdown, startup, update_job_status
+
+
+class EmbeddedJobQueue:
+    """
+    Bounded in-process job queue for embedded single-node mode.
+
+    Runs generate_panel on a fixed number of asyncio workers inside the API
+    process, with the same ctx keys the arq worker provides, so job status
+    and events behave exactly as in the queued deployment.
+    """
+
+    def __init__(self, events: MemoryJobEventLog, concurrency: int, maxsize: int):
+        self.events = events
+        self.concurrency = concurrency
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.ctx: dict = {'events': events}
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self):
+        await startup(self.ctx)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        logger.info("Embedded job queue started", concurrency=self.concurrency, maxsize=self.queue.maxsize)
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await shutdown(self.ctx)
+
+    def enqueue(self, job_id: str, images_urls: List[str], options: Optional[dict] = None):
+        """
+        Adds a job to the queue. Raises asyncio.QueueFull when at capacity.
+        """
+        self.queue.put_nowait((job_id, images_urls, options))
+
+    async def _work(self):
+        while True:
+            job_id, images_urls, options = await self.queue.get()
+            job_ctx = {**self.ctx, 'job_id': job_id, 'job_try': 1}
+            try:
+                await asyncio.wait_for(generate_panel(job_ctx, images_urls, options), timeout=JOB_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.error("Job timed out", job_id=job_id)
+                await update_job_status(job_ctx, job_id, JobStatus.FAILED, error_message="Job timed out")
+            except Exception:
+                # generate_panel records its own failures; this only guards the worker loop
+                logger.error("Embedded job crashed", job_id=job_id, exc_info=True)
+            finally:
+                self.queue.task_done()
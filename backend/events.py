@@ -0,0 +1,402 @@
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from schemas import JobEvent, JobEventType, JobResponse, JobStatus, ModelCallStats, StageStats
+
+# Per-job state lives under two keys:
+#   job:{job_id}         -> hash with the latest snapshot (what GET /job reads)
+#   job:{job_id}:events  -> append-only stream of timestamped events
+# Both are written in a single pipelined round-trip and share the same TTL.
+JOB_TTL_SECONDS = 86400
+# Approximate cap on stream length; a job emits a handful of events, this only
+# guards against runaway producers.
+EVENTS_MAXLEN = 256
+STAGE_STATS_KEY = "stats:stage_durations"
+MODEL_CALL_STATS_KEY = "stats:model_calls"
+
+SNAPSHOT_FIELDS = ("status", "result_url", "preview_url", "derivative_urls", "error_message")
+TERMINAL_STATUSES = {JobStatus.COMPLETED, JobStatus.FAILED}
+
+
+def job_key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+def events_key(job_id: str) -> str:
+    return f"job:{job_id}:events"
+
+
+def _decode(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _stream_id_key(event_id: str) -> tuple:
+    ms, _, seq = event_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+def _parse_derivatives(data: dict) -> Optional[Dict[str, str]]:
+    raw = data.get("derivative_urls")
+    return json.loads(raw) if raw else None
+
+
+def _parse_event(job_id: str, event_id, fields: dict) -> JobEvent:
+    data = {_decode(k): _decode(v) for k, v in fields.items()}
+    progress = data.get("progress")
+    return JobEvent(
+        event_id=_decode(event_id),
+        job_id=job_id,
+        type=JobEventType(data["type"]),
+        timestamp=float(data["ts"]),
+        status=JobStatus(data["status"]) if data.get("status") else None,
+        message=data.get("message") or None,
+        progress=float(progress) if progress else None,
+        result_url=data.get("result_url") or None,
+        preview_url=data.get("preview_url") or None,
+        derivative_urls=_parse_derivatives(data),
+        error_message=data.get("error_message") or None,
+    )
+
+
+def _event_fields(
+    event_type: JobEventType,
+    status: Optional[JobStatus],
+    message: Optional[str],
+    progress: Optional[float],
+    result_url: Optional[str],
+    preview_url: Optional[str],
+    derivative_urls: Optional[Dict[str, str]],
+    error_message: Optional[str],
+) -> Dict[str, str]:
+    fields = {"type": event_type.value, "ts": repr(time.time())}
+    if status:
+        fields["status"] = status.value
+    if message:
+        fields["message"] = message
+    if progress is not None:
+        fields["progress"] = repr(progress)
+    if result_url:
+        fields["result_url"] = result_url
+    if preview_url:
+        fields["preview_url"] = preview_url
+    if derivative_urls:
+        fields["derivative_urls"] = json.dumps(derivative_urls)
+    if error_message:
+        fields["error_message"] = error_message
+    return fields
+
+
+def _snapshot_from_hash(job_id: str, data: dict) -> Optional[JobResponse]:
+    if not data:
+        return None
+    data = {_decode(k): _decode(v) for k, v in data.items()}
+    return JobResponse(
+        job_id=job_id,
+        status=JobStatus(data["status"]),
+        result_url=data.get("result_url") or None,
+        preview_url=data.get("preview_url") or None,
+        derivative_urls=_parse_derivatives(data),
+        error_message=data.get("error_message") or None,
+    )
+
+
+def _stage_stats_from_hash(data: dict) -> List[StageStats]:
+    data = {_decode(k): _decode(v) for k, v in data.items()}
+    stats = []
+    for key, count in data.items():
+        stage, _, field = key.rpartition(":")
+        if field != "count" or not int(count):
+            continue
+        total = float(data.get(f"{stage}:total", 0.0))
+        stats.append(StageStats(
+            stage=JobStatus(stage),
+            count=int(count),
+            total_seconds=total,
+            mean_seconds=total / int(count),
+        ))
+    return sorted(stats, key=lambda s: list(JobStatus).index(s.stage))
+
+
+def _model_call_stats_from_hash(data: dict) -> List[ModelCallStats]:
+    per_stage: Dict[str, Dict[str, int]] = {}
+    for key, value in data.items():
+        stage, _, name = _decode(key).rpartition(":")
+        per_stage.setdefault(stage, {})[name] = int(_decode(value))
+    return [
+        ModelCallStats(
+            stage=stage,
+            **{name: counters.get(name, 0) for name in ModelCallStats.model_fields if name != "stage"},
+        )
+        for stage, counters in sorted(per_stage.items())
+    ]
+
+
+def stage_durations(events: List[JobEvent]) -> Dict[str, float]:
+    """
+    Computes how long the job spent in each status, from consecutive
+    status events. The terminal status has no duration.
+    """
+    durations: Dict[str, float] = {}
+    status_events = [e for e in events if e.type == JobEventType.STATUS]
+    for current, following in zip(status_events, status_events[1:]):
+        stage = current.status.value
+        durations[stage] = durations.get(stage, 0.0) + (following.timestamp - current.timestamp)
+    return durations
+
+
+class RedisJobEventLog:
+    """
+    Job status snapshots plus an append-only event stream, backed by Redis.
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def append(
+        self,
+        job_id: str,
+        event_type: JobEventType,
+        status: Optional[JobStatus] = None,
+        message: Optional[str] = None,
+        progress: Optional[float] = None,
+        result_url: Optional[str] = None,
+        preview_url: Optional[str] = None,
+        derivative_urls: Optional[Dict[str, str]] = None,
+        error_message: Optional[str] = None,
+    ) -> str:
+        """
+        Appends an event to the job stream and, for status events, updates the
+        snapshot hash. Returns the stream id of the new event.
+        """
+        fields = _event_fields(event_type, status, message, progress, result_url, preview_url, derivative_urls, error_message)
+        pipe = self.redis.pipeline(transaction=False)
+        if event_type == JobEventType.STATUS:
+            snapshot = {k: v for k, v in fields.items() if k in SNAPSHOT_FIELDS}
+            pipe.hset(job_key(job_id), mapping=snapshot)
+            pipe.expire(job_key(job_id), JOB_TTL_SECONDS)
+        pipe.xadd(events_key(job_id), fields, maxlen=EVENTS_MAXLEN, approximate=True)
+        pipe.expire(events_key(job_id), JOB_TTL_SECONDS)
+        results = await pipe.execute()
+        return _decode(results[-2])
+
+    async def append_status(
+        self,
+        job_id: str,
+        status: JobStatus,
+        result_url: Optional[str] = None,
+        preview_url: Optional[str] = None,
+        derivative_urls: Optional[Dict[str, str]] = None,
+        error_message: Optional[str] = None,
+    ) -> str:
+        """
+        Appends a status event, preceded by an error event when there is an
+        error message, in a single round-trip. Returns the status event's id.
+        """
+        fields = _event_fields(JobEventType.STATUS, status, None, None, result_url, preview_url, derivative_urls, error_message)
+        pipe = self.redis.pipeline(transaction=False)
+        if error_message:
+            error_fields = _event_fields(JobEventType.ERROR, status, None, None, None, None, None, error_message)
+            pipe.xadd(events_key(job_id), error_fields, maxlen=EVENTS_MAXLEN, approximate=True)
+        pipe.hset(job_key(job_id), mapping={k: v for k, v in fields.items() if k in SNAPSHOT_FIELDS})
+        pipe.expire(job_key(job_id), JOB_TTL_SECONDS)
+        pipe.xadd(events_key(job_id), fields, maxlen=EVENTS_MAXLEN, approximate=True)
+        pipe.expire(events_key(job_id), JOB_TTL_SECONDS)
+        results = await pipe.execute()
+        return _decode(results[-2])
+
+    async def refresh(self, job_ids: List[str], ttl: int = JOB_TTL_SECONDS):
+        """
+        Keeps the snapshots and event streams of jobs that are still waiting
+        (e.g. in a bulk batch) alive for another `ttl` seconds.
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for job_id in job_ids:
+            pipe.expire(job_key(job_id), ttl)
+            pipe.expire(events_key(job_id), ttl)
+        await pipe.execute()
+
+    async def snapshot(self, job_id: str) -> Optional[JobResponse]:
+        return _snapshot_from_hash(job_id, await self.redis.hgetall(job_key(job_id)))
+
+    async def read(
+        self,
+        job_id: str,
+        after: str = "0-0",
+        count: Optional[int] = None,
+        block_ms: Optional[int] = None,
+    ) -> List[JobEvent]:
+        """
+        Returns events with an id strictly greater than `after`.
+        With `block_ms`, waits up to that long for new events to arrive.
+        """
+        response = await self.redis.xread({events_key(job_id): after}, count=count, block=block_ms)
+        if not response:
+            return []
+        _, entries = response[0]
+        return [_parse_event(job_id, event_id, fields) for event_id, fields in entries]
+
+    async def record_stage_durations(self, job_id: str) -> Dict[str, float]:
+        """
+        Folds the stage durations of a finished job into the aggregate stats.
+        """
+        durations = stage_durations(await self.read(job_id))
+        if durations:
+            pipe = self.redis.pipeline(transaction=False)
+            for stage, seconds in durations.items():
+                pipe.hincrbyfloat(STAGE_STATS_KEY, f"{stage}:total", seconds)
+                pipe.hincrby(STAGE_STATS_KEY, f"{stage}:count", 1)
+            await pipe.execute()
+        return durations
+
+    async def stage_stats(self) -> List[StageStats]:
+        return _stage_stats_from_hash(await self.redis.hgetall(STAGE_STATS_KEY))
+
+    async def record_model_call_stats(self, stage: str, counters: Dict[str, int]):
+        """
+        Adds one job's retry/hedge counters for a model call stage to the totals.
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for name, value in counters.items():
+            if value:
+                pipe.hincrby(MODEL_CALL_STATS_KEY, f"{stage}:{name}", value)
+        await pipe.execute()
+
+    async def model_call_stats(self) -> List[ModelCallStats]:
+        return _model_call_stats_from_hash(await self.redis.hgetall(MODEL_CALL_STATS_KEY))
+
+
+class MemoryJobEventLog:
+    """
+    In-process equivalent of RedisJobEventLog for embedded single-node mode.
+    Same ids, TTL and length bounds; state is lost when the process exits.
+    """
+
+    def __init__(self):
+        self._snapshots: Dict[str, Dict[str, str]] = {}
+        self._streams: Dict[str, deque] = {}
+        self._expires_at: Dict[str, float] = {}
+        self._stage_stats: Dict[str, float] = {}
+        self._model_call_stats: Dict[str, int] = {}
+        self._last_id = (0, 0)
+        self._changed = asyncio.Condition()
+
+    def _next_id(self) -> str:
+        # Same "<ms>-<seq>" shape as Redis stream ids, strictly increasing
+        ms = int(time.time() * 1000)
+        last_ms, last_seq = self._last_id
+        self._last_id = (ms, 0) if ms > last_ms else (last_ms, last_seq + 1)
+        return f"{self._last_id[0]}-{self._last_id[1]}"
+
+    def _expire(self):
+        now = time.monotonic()
+        for job_id in [j for j, expires_at in self._expires_at.items() if expires_at <= now]:
+            self._snapshots.pop(job_id, None)
+            self._streams.pop(job_id, None)
+            del self._expires_at[job_id]
+
+    async def append(
+        self,
+        job_id: str,
+        event_type: JobEventType,
+        status: Optional[JobStatus] = None,
+        message: Optional[str] = None,
+        progress: Optional[float] = None,
+        result_url: Optional[str] = None,
+        preview_url: Optional[str] = None,
+        derivative_urls: Optional[Dict[str, str]] = None,
+        error_message: Optional[str] = None,
+    ) -> str:
+        self._expire()
+        fields = _event_fields(event_type, status, message, progress, result_url, preview_url, derivative_urls, error_message)
+        if event_type == JobEventType.STATUS:
+            snapshot = self._snapshots.setdefault(job_id, {})
+            snapshot.update({k: v for k, v in fields.items() if k in SNAPSHOT_FIELDS})
+        event_id = self._next_id()
+        self._streams.setdefault(job_id, deque(maxlen=EVENTS_MAXLEN)).append((event_id, fields))
+        self._expires_at[job_id] = time.monotonic() + JOB_TTL_SECONDS
+        async with self._changed:
+            self._changed.notify_all()
+        return event_id
+
+    async def append_status(
+        self,
+        job_id: str,
+        status: JobStatus,
+        result_url: Optional[str] = None,
+        preview_url: Optional[str] = None,
+        derivative_urls: Optional[Dict[str, str]] = None,
+        error_message: Optional[str] = None,
+    ) -> str:
+        if error_message:
+            await self.append(job_id, JobEventType.ERROR, status=status, error_message=error_message)
+        return await self.append(
+            job_id,
+            JobEventType.STATUS,
+            status=status,
+            result_url=result_url,
+            preview_url=preview_url,
+            derivative_urls=derivative_urls,
+            error_message=error_message,
+        )
+
+    async def refresh(self, job_ids: List[str], ttl: int = JOB_TTL_SECONDS):
+        self._expire()
+        for job_id in job_ids:
+            if job_id in self._expires_at:
+                self._expires_at[job_id] = time.monotonic() + ttl
+
+    async def snapshot(self, job_id: str) -> Optional[JobResponse]:
+        self._expire()
+        return _snapshot_from_hash(job_id, self._snapshots.get(job_id))
+
+    def _read_now(self, job_id: str, after: str, count: Optional[int]) -> List[JobEvent]:
+        after_key = _stream_id_key(after)
+        entries = [
+            (event_id, fields) for event_id, fields in self._streams.get(job_id, ())
+            if _stream_id_key(event_id) > after_key
+        ]
+        if count:
+            entries = entries[:count]
+        return [_parse_event(job_id, event_id, fields) for event_id, fields in entries]
+
+    async def read(
+        self,
+        job_id: str,
+        after: str = "0-0",
+        count: Optional[int] = None,
+        block_ms: Optional[int] = None,
+    ) -> List[JobEvent]:
+        events = self._read_now(job_id, after, count)
+        if events or not block_ms:
+            return events
+        try:
+            async with self._changed:
+                await asyncio.wait_for(
+                    self._changed.wait_for(lambda: bool(self._read_now(job_id, after, count))),
+                    timeout=block_ms / 1000,
+                )
+        except asyncio.TimeoutError:
+            return []
+        return self._read_now(job_id, after, count)
+
+    async def record_stage_durations(self, job_id: str) -> Dict[str, float]:
+        durations = stage_durations(await self.read(job_id))
+        for stage, seconds in durations.items():
+            self._stage_stats[f"{stage}:total"] = self._stage_stats.get(f"{stage}:total", 0.0) + seconds
+            self._stage_stats[f"{stage}:count"] = self._stage_stats.get(f"{stage}:count", 0) + 1
+        return durations
+
+    async def stage_stats(self) -> List[StageStats]:
+        return _stage_stats_from_hash(self._stage_stats)
+
+    async def record_model_call_stats(self, stage: str, counters: Dict[str, int]):
+        for name, value in counters.items():
+            if value:
+                key = f"{stage}:{name}"
+                self._model_call_stats[key] = self._model_call_stats.get(key, 0) + value
+
+    async def model_call_stats(self) -> List[ModelCallStats]:
+        return _model_call_stats_from_hash(self._model_call_stats)
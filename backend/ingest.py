@@ -0,0 +1,277 @@
+import asyncio
+import hashlib
+import io
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+from pydantic import ValidationError
+from python_multipart import MultipartParser
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import parse_options_header
+from starlette.requests import ClientDisconnect, Request
+
+from config import settings
+from schemas import GenerateRequest
+from storage import StagedInput, input_blob_name, staging_blob_name
+from utils import logger
+
+MAX_IMAGES = 8
+MAX_IMAGE_PIXELS = 50_000_000
+# Enough for the dimensions of any sane JPEG (SOF comes after EXIF/ICC segments)
+SNIFF_LIMIT = 256 * 1024
+MAX_FIELD_BYTES = 1024
+# Image formats we accept, keyed by Pillow format: (extension, content type)
+IMAGE_FORMATS = {
+    "JPEG": ("jpg", "image/jpeg"),
+    "PNG": ("png", "image/png"),
+    "WEBP": ("webp", "image/webp"),
+}
+
+
+class IngestError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class IngestedUpload:
+    urls: List[str]
+    options: GenerateRequest
+
+
+def _has_image_magic(head: bytes) -> bool:
+    return (
+        head.startswith(b"\xff\xd8\xff")
+        or head.startswith(b"\x89PNG\r\n\x1a\n")
+        or (head[:4] == b"RIFF" and head[8:12] == b"WEBP")
+    )
+
+
+def sniff_image_header(head: bytes, final: bool) -> Optional[Tuple[str, int, int]]:
+    """
+    Identifies an image from its first bytes without decoding pixels.
+
+    Returns (format, width, height), or None if more bytes are needed.
+    Raises IngestError if the bytes can't be a supported image.
+    """
+    if (len(head) >= 12 or final) and not _has_image_magic(head):
+        raise IngestError(415, "Unsupported image type; only JPEG, PNG and WebP are accepted")
+    try:
+        with Image.open(io.BytesIO(head)) as img:
+            fmt, (width, height) = img.format, img.size
+    except Image.DecompressionBombError:
+        raise IngestError(413, "Image dimensions are too large")
+    except Exception:
+        if final or len(head) >= SNIFF_LIMIT:
+            raise IngestError(415, "Could not read image header")
+        return None
+
+    if fmt not in IMAGE_FORMATS:
+        raise IngestError(415, f"Unsupported image type: {fmt}")
+    if not width or not height:
+        raise IngestError(415, "Image has no dimensions")
+    if width * height > MAX_IMAGE_PIXELS:
+        raise IngestError(413, f"Image dimensions are too large: {width}x{height}")
+    return fmt, width, height
+
+
+class _ImagePart:
+    """
+    One uploaded image, hashed and streamed to a staging location as it
+    arrives. Only the header is held in memory, and only until the image has
+    been identified. Once the request is accepted it is stored under its
+    content hash, and not stored again if that blob already exists.
+    """
+
+    def __init__(self, job_id: str, index: int, max_bytes: int):
+        self.job_id = job_id
+        self.index = index
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.head = b""
+        self.format: Optional[str] = None
+        self.digest = hashlib.sha256()
+        self.staged: Optional[StagedInput] = None
+
+    async def _start(self, fmt: str):
+        self.format = fmt
+        self.staged = StagedInput(staging_blob_name(self.job_id, self.index), IMAGE_FORMATS[fmt][1])
+        await self._write(self.head)
+        self.head = b""
+
+    async def _write(self, data: bytes):
+        self.digest.update(data)
+        await self.staged.write(data)
+
+    async def feed(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise IngestError(413, f"Image {self.index} exceeds {self.max_bytes} bytes")
+        if self.staged:
+            await self._write(chunk)
+            return
+        self.head += chunk
+        info = sniff_image_header(self.head, final=False)
+        if info:
+            await self._start(info[0])
+
+    async def complete(self):
+        if not self.staged:
+            await self._start(sniff_image_header(self.head, final=True)[0])
+        await self.staged.finish()
+
+    async def store(self) -> Tuple[str, bool]:
+        ext, _ = IMAGE_FORMATS[self.format]
+        return await self.staged.commit(input_blob_name(self.digest.hexdigest(), ext))
+
+    async def discard(self):
+        if self.staged:
+            await self.staged.discard()
+
+
+@dataclass
+class _Part:
+    name: str = ""
+    filename: Optional[str] = None
+    value: bytearray = field(default_factory=bytearray)
+    image: Optional[_ImagePart] = None
+
+
+class _ParserEvents:
+    """
+    Collects python-multipart's synchronous callbacks so they can be handled
+    asynchronously after each chunk is parsed.
+    """
+
+    def __init__(self):
+        self.events: List[Tuple[str, object]] = []
+        self._headers: Dict[str, str] = {}
+        self._field = b""
+        self._value = b""
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        }
+
+    def drain(self) -> List[Tuple[str, object]]:
+        events, self.events = self.events, []
+        return events
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._field.decode("latin-1").lower()] = self._value.decode("latin-1")
+        self._field = b""
+        self._value = b""
+
+    def _on_headers_finished(self):
+        self.events.append(("headers", self._headers))
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        self.events.append(("data", bytes(data[start:end])))
+
+    def _on_part_end(self):
+        self.events.append(("end", None))
+
+
+async def ingest_upload(request: Request, job_id: str) -> IngestedUpload:
+    """
+    Reads a multipart /generate request and stores its images.
+
+    Each image is identified from its first bytes and rejected as soon as it
+    is oversize, not a supported image, or beyond the 8-image limit, before
+    the rest of the request is read. Memory use per request is bounded by the
+    sniff buffer and the upload chunk size; image bodies are streamed to
+    staging blobs. Nothing reaches the content-addressed store until the whole
+    request has been accepted, and images already in it are not stored again.
+    """
+    max_bytes = settings.MAX_IMAGE_BYTES
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_IMAGES * max_bytes + 64 * 1024:
+        raise IngestError(413, "Request body is too large")
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type.lower() != b"multipart/form-data" or not boundary:
+        raise IngestError(415, "Expected multipart/form-data")
+
+    sink = _ParserEvents()
+    parser = MultipartParser(boundary, sink.callbacks())
+    images: List[_ImagePart] = []
+    fields: Dict[str, str] = {}
+    part: Optional[_Part] = None
+
+    async def _handle(kind: str, payload):
+        nonlocal part
+        if kind == "headers":
+            _, disposition = parse_options_header(payload.get("content-disposition", ""))
+            part = _Part(
+                name=disposition.get(b"name", b"").decode("utf-8", "replace"),
+                filename=disposition[b"filename"].decode("utf-8", "replace") if b"filename" in disposition else None,
+            )
+            if part.name == "images":
+                if len(images) >= MAX_IMAGES:
+                    raise IngestError(422, f"At most {MAX_IMAGES} images are accepted")
+                part.image = _ImagePart(job_id, len(images), max_bytes)
+                images.append(part.image)
+        elif kind == "data":
+            if part.image:
+                await part.image.feed(payload)
+            else:
+                part.value += payload
+                if len(part.value) > MAX_FIELD_BYTES:
+                    raise IngestError(413, f"Form field too large: {part.name}")
+        elif kind == "end":
+            if part.image:
+                await part.image.complete()
+            elif part.name:
+                fields[part.name] = part.value.decode("utf-8", "replace")
+            part = None
+
+    try:
+        try:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                for kind, payload in sink.drain():
+                    await _handle(kind, payload)
+            parser.finalize()
+            for kind, payload in sink.drain():
+                await _handle(kind, payload)
+        except MultipartParseError as e:
+            raise IngestError(400, f"Malformed multipart body: {e}")
+        except ClientDisconnect:
+            raise IngestError(400, "Client disconnected during upload")
+
+        if not images:
+            raise IngestError(422, "At least one image is required")
+        try:
+            options = GenerateRequest(**fields)
+        except ValidationError as e:
+            raise IngestError(422, f"Invalid options: {e.errors()}")
+
+        stored = await asyncio.gather(*[image.store() for image in images])
+    finally:
+        # Staged copies of rejected requests are dropped; stored ones already are
+        await asyncio.gather(*[image.discard() for image in images], return_exceptions=True)
+
+    urls = [url for url, _ in stored]
+    uploaded = sum(1 for _, was_uploaded in stored if was_uploaded)
+    logger.info("Stored inputs", job_id=job_id, num_images=len(urls), uploaded=uploaded, reused=len(urls) - uploaded)
+    return IngestedUpload(urls=urls, options=options)
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import shutil
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict
+
+from storage import INPUTS_PREFIX, blob_name_from_url, download_file
+from utils import logger
+
+
+class InputCache:
+    """
+    Size-bounded on-disk LRU of downloaded inputs, keyed by content hash.
+
+    Only content-addressed inputs (inputs/sha256/...) are cached, since their
+    bytes can never change under the same name. Files are handed to jobs as
+    hard links, so evicting an entry never pulls a file out from under a job
+    that is still reading it. Concurrent misses for the same input share one
+    download.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Pick up what a previous run left behind, least recently used first
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            if entry.name.startswith("."):
+                # An interrupted download
+                os.unlink(entry.path)
+                continue
+            stat = entry.stat()
+            files.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self.size += size
+        self._evict()
+
+    def _evict(self):
+        while self.size > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self.size -= size
+            try:
+                os.unlink(self.directory / name)
+            except OSError:
+                pass
+
+    async def _download(self, url: str, name: str):
+        path = self.directory / name
+        tmp_path = self.directory / f".{name}.part"
+        try:
+            await download_file(url, str(tmp_path))
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        size = path.stat().st_size
+        self._entries[name] = size
+        self.size += size
+        self._evict()
+
+    async def _ensure(self, url: str, name: str):
+        if name in self._entries:
+            self._entries.move_to_end(name)
+            self.hits += 1
+            return
+        if name in self._loading:
+            self.hits += 1
+            return await asyncio.shield(self._loading[name])
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[name] = future
+        try:
+            await self._download(url, name)
+            future.set_result(None)
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters get the error; nobody else needs to retrieve it
+            future.exception()
+            raise
+        finally:
+            del self._loading[name]
+
+    async def fetch(self, url: str, destination: Path):
+        """
+        Places the input at `url` at `destination`, from the cache when possible.
+        """
+        blob_name = blob_name_from_url(url)
+        if not blob_name.startswith(INPUTS_PREFIX):
+            await download_file(url, str(destination))
+            return
+
+        name = blob_name[len(INPUTS_PREFIX):]
+        await self._ensure(url, name)
+        path = self.directory / name
+        try:
+            os.link(path, destination)
+            # Recency survives restarts through the file's mtime
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted between the download and the link; fetch it directly
+            logger.info("Input evicted before use, downloading", blob=blob_name)
+            await download_file(url, str(destination))
+        except OSError:
+            # Hard links need the cache and the job directory on one filesystem
+            await asyncio.to_thread(shutil.copyfile, path, destination)
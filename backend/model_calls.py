@@ -0,0 +1,164 @@
+import asyncio
+import random
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+from google.genai import errors as genai_errors
+
+from utils import logger
+
+T = TypeVar("T")
+
+# Rate limits, timeouts and server-side failures are worth another attempt;
+# anything else (bad request, safety block, auth) will fail the same way again.
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Any attempt but the last may use at most this share of what is left of the
+# stage budget, so a stalled call is cut off while there is still time to retry.
+ATTEMPT_BUDGET_SHARE = 0.5
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    pass
+
+
+class Deadline:
+    """
+    Absolute time budget, measured on the monotonic clock.
+    """
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def stage_timeout(self, share: float = 1.0, reserve: float = 0.0) -> float:
+        """
+        Budget for one stage: `share` of whatever is left after keeping
+        `reserve` seconds back for the stages that follow it.
+        """
+        return max(0.0, (self.remaining() - reserve) * share)
+
+
+@dataclass
+class CallStats:
+    calls: int = 0
+    attempts: int = 0
+    retries: int = 0
+    hedges: int = 0
+    hedge_wins: int = 0
+    failures: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class LatencyTracker:
+    """
+    Rolling window of successful call latencies, used to decide when a call
+    is slow enough to be worth hedging.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, genai_errors.APIError):
+        return exc.code in RETRYABLE_STATUS_CODES
+    return isinstance(exc, (asyncio.TimeoutError, httpx.TransportError, ConnectionError))
+
+
+async def _hedged(fn: Callable[[], Awaitable[T]], hedge_after: float, stats: CallStats) -> T:
+    """
+    Starts `fn`, and if it hasn't finished after `hedge_after` seconds starts a
+    duplicate. The first success wins and the other call is cancelled.
+    """
+    primary = asyncio.ensure_future(fn())
+    done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+    if done:
+        return primary.result()
+
+    stats.hedges += 1
+    hedge = asyncio.ensure_future(fn())
+    pending = {primary, hedge}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        stats.hedge_wins += 1
+                    return task.result()
+        # Both failed; surface the primary's error
+        return primary.result()
+    finally:
+        for task in (primary, hedge):
+            if not task.done():
+                task.cancel()
+
+
+async def call_model(
+    fn: Callable[[], Awaitable[T]],
+    *,
+    deadline: Deadline,
+    stage_timeout: float,
+    stats: CallStats,
+    max_attempts: int = 3,
+    base_delay: float = 1.0,
+    max_delay: float = 8.0,
+    hedge_after: Optional[float] = None,
+    latency: Optional[LatencyTracker] = None,
+    attempt_share: float = ATTEMPT_BUDGET_SHARE,
+) -> T:
+    """
+    Runs a model call with a stage deadline and jittered retries.
+
+    Each attempt but the last gets `attempt_share` of what is left of the
+    stage budget, and the last gets all of it (never more than the job
+    deadline), so a hung call times out and is retried instead of using up
+    the whole stage. Only retryable errors are retried, and a retry is
+    skipped when its backoff would not leave any time for the attempt. With
+    `hedge_after`, a duplicate request is sent if an attempt runs longer than
+    that many seconds.
+    """
+    stats.calls += 1
+    stage_deadline = Deadline(min(stage_timeout, deadline.remaining()))
+    attempt = 0
+    while True:
+        attempt += 1
+        stats.attempts += 1
+        timeout = stage_deadline.remaining()
+        if attempt < max_attempts:
+            timeout *= attempt_share
+        started = time.monotonic()
+        try:
+            if timeout <= 0:
+                raise DeadlineExceeded("Stage deadline exceeded before the call could start")
+            call = _hedged(fn, hedge_after, stats) if hedge_after else fn()
+            result = await asyncio.wait_for(call, timeout=timeout)
+            if latency:
+                latency.observe(time.monotonic() - started)
+            return result
+        except Exception as e:
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            if attempt >= max_attempts or not is_retryable(e) or delay >= stage_deadline.remaining():
+                stats.failures += 1
+                raise
+            stats.retries += 1
+            logger.warning("Retrying model call", attempt=attempt, delay=round(delay, 2), error=str(e))
+            await asyncio.sleep(delay)
@@ -0,0 +1,264 @@
+import asyncio
+import json
+import mimetypes
+import os
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Iterable, List, Optional, Sequence, Tuple, Union
+
+import httpx
+import websockets
+
+from schemas import JobResponse, JobStatus
+
+TERMINAL_STATUSES = {JobStatus.COMPLETED, JobStatus.FAILED}
+
+UpdateCallback = Callable[[JobResponse], Union[None, Awaitable[None]]]
+
+
+class PanelOneError(Exception):
+    pass
+
+
+class PanelOneHTTPError(PanelOneError):
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def retryable(self) -> bool:
+        # Overload and gateway errors (e.g. a Cloud Run 502/503) are transient
+        return self.status_code == 429 or self.status_code >= 500
+
+
+class JobFailedError(PanelOneError):
+    def __init__(self, job_id: str, message: Optional[str]):
+        super().__init__(f"Job {job_id} failed: {message or 'Unknown error'}")
+        self.job_id = job_id
+        self.message = message
+
+
+@dataclass
+class JobResult:
+    job: JobResponse
+    output_path: Optional[Path] = None
+
+
+async def _notify(on_update: Optional[UpdateCallback], job: JobResponse):
+    if on_update:
+        result = on_update(job)
+        if asyncio.iscoroutine(result):
+            await result
+
+
+class PanelOneClient:
+    """
+    Async client for the Panel One API.
+
+    A single client keeps one pooled HTTP session alive for every request it
+    makes, so it can track many jobs concurrently from one process:
+
+        async with PanelOneClient(API_URL) as client:
+            results = await client.run_many(albums, concurrency=16)
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        max_connections: int = 64,
+        poll_interval: float = 1.0,
+        max_poll_errors: int = 10,
+        request_timeout: float = 300.0,
+        use_websocket: bool = True,
+    ):
+        self.api_url = api_url.rstrip("/")
+        self.max_connections = max_connections
+        self.poll_interval = poll_interval
+        self.max_poll_errors = max_poll_errors
+        self.request_timeout = request_timeout
+        self.use_websocket = use_websocket
+        self._session: Optional[httpx.AsyncClient] = None
+
+    async def __aenter__(self) -> "PanelOneClient":
+        self._session = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.max_connections),
+            timeout=httpx.Timeout(self.request_timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._session:
+            await self._session.aclose()
+            self._session = None
+
+    @property
+    def session(self) -> httpx.AsyncClient:
+        if self._session is None:
+            raise PanelOneError("Client is not open; use 'async with PanelOneClient(...)'")
+        return self._session
+
+    def _ws_url(self, job_id: str) -> str:
+        base = self.api_url
+        if base.startswith("https://"):
+            base = "wss://" + base[len("https://"):]
+        elif base.startswith("http://"):
+            base = "ws://" + base[len("http://"):]
+        return f"{base}/ws/{job_id}"
+
+    async def submit(
+        self,
+        image_paths: Sequence[Path],
+        aspect_ratio: Optional[str] = None,
+        image_size: Optional[str] = None,
+        preview: bool = False,
+        tier: str = "interactive",
+    ) -> JobResponse:
+        """
+        Uploads the images and enqueues a job. Returns the initial JobResponse.
+        """
+        files = []
+        opened_files = []
+        try:
+            for path in image_paths:
+                f = open(path, "rb")
+                opened_files.append(f)
+                content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+                files.append(("images", (path.name, f, content_type)))
+            data = {"preview": "true" if preview else "false", "tier": tier}
+            if aspect_ratio:
+                data["aspect_ratio"] = aspect_ratio
+            if image_size:
+                data["image_size"] = image_size
+
+            resp = await self.session.post(f"{self.api_url}/generate", files=files, data=data)
+            if resp.status_code >= 400:
+                raise PanelOneError(f"Submit failed ({resp.status_code}): {resp.text}")
+            return JobResponse.model_validate(resp.json())
+        finally:
+            for f in opened_files:
+                f.close()
+
+    async def get_job(self, job_id: str) -> JobResponse:
+        resp = await self.session.get(f"{self.api_url}/job/{job_id}")
+        if resp.status_code >= 400:
+            raise PanelOneHTTPError(f"Status request failed ({resp.status_code}): {resp.text}", resp.status_code)
+        return JobResponse.model_validate(resp.json())
+
+    async def _watch_websocket(self, job_id: str, on_update: Optional[UpdateCallback]) -> Optional[JobResponse]:
+        """
+        Follows the job over /ws. Returns the terminal response, or None if the
+        socket closed before the job finished.
+        """
+        async with websockets.connect(self._ws_url(job_id), ping_interval=30) as ws:
+            async for message in ws:
+                job = JobResponse.model_validate(json.loads(message))
+                await _notify(on_update, job)
+                if job.status in TERMINAL_STATUSES:
+                    return job
+        return None
+
+    async def _poll(self, job_id: str, on_update: Optional[UpdateCallback]) -> JobResponse:
+        errors = 0
+        last_status = None
+        while True:
+            try:
+                job = await self.get_job(job_id)
+                errors = 0
+            except (httpx.TransportError, asyncio.TimeoutError, PanelOneHTTPError) as e:
+                if isinstance(e, PanelOneHTTPError) and not e.retryable:
+                    raise
+                errors += 1
+                if errors >= self.max_poll_errors:
+                    raise PanelOneError(f"Lost contact with API while polling job {job_id}: {e}") from e
+                # Back off with jitter on transient errors instead of hammering the API
+                await asyncio.sleep(self.poll_interval * min(2 ** errors, 30) * random.uniform(0.5, 1.0))
+                continue
+
+            if job.status != last_status:
+                last_status = job.status
+                await _notify(on_update, job)
+            if job.status in TERMINAL_STATUSES:
+                return job
+            await asyncio.sleep(self.poll_interval)
+
+    async def wait(self, job_id: str, on_update: Optional[UpdateCallback] = None) -> JobResponse:
+        """
+        Waits for the job to finish, subscribing to /ws/{job_id} and falling back
+        to polling /job/{job_id} if the socket is unavailable or drops.
+        Raises JobFailedError if the job fails.
+        """
+        job = None
+        if self.use_websocket:
+            try:
+                job = await self._watch_websocket(job_id, on_update)
+            except (websockets.exceptions.WebSocketException, OSError, asyncio.TimeoutError):
+                job = None
+        if job is None:
+            job = await self._poll(job_id, on_update)
+
+        if job.status == JobStatus.FAILED:
+            raise JobFailedError(job_id, job.error_message)
+        return job
+
+    async def download(self, url: str, destination: Path, chunk_size: int = 256 * 1024) -> Path:
+        """
+        Streams a result to disk without holding it in memory. The file is
+        written next to the destination and renamed into place when complete.
+        """
+        tmp_path = destination.with_name(f".{destination.name}.part")
+        try:
+            async with self.session.stream("GET", url) as resp:
+                if resp.status_code >= 400:
+                    raise PanelOneError(f"Download failed ({resp.status_code}): {url}")
+                with open(tmp_path, "wb") as f:
+                    async for chunk in resp.aiter_bytes(chunk_size):
+                        f.write(chunk)
+            os.replace(tmp_path, destination)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        return destination
+
+    async def run(
+        self,
+        image_paths: Sequence[Path],
+        destination: Optional[Path] = None,
+        on_update: Optional[UpdateCallback] = None,
+        **options,
+    ) -> JobResult:
+        """
+        Submits a job, waits for it and optionally downloads the result.
+        """
+        job = await self.submit(image_paths, **options)
+        await _notify(on_update, job)
+        job = await self.wait(job.job_id, on_update)
+        output_path = None
+        if destination and job.result_url:
+            output_path = await self.download(job.result_url, destination)
+        return JobResult(job=job, output_path=output_path)
+
+    async def run_many(
+        self,
+        albums: Iterable[Tuple[Sequence[Path], Optional[Path]]],
+        concurrency: int = 8,
+        on_update: Optional[Callable[[int, JobResponse], Union[None, Awaitable[None]]]] = None,
+        **options,
+    ) -> List[Union[JobResult, BaseException]]:
+        """
+        Runs one job per (image_paths, destination) pair with at most
+        `concurrency` jobs in flight. Results come back in input order; a
+        failed album yields its exception instead of aborting the batch.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _run_one(index: int, image_paths: Sequence[Path], destination: Optional[Path]) -> JobResult:
+            async with semaphore:
+                callback = (lambda job: on_update(index, job)) if on_update else None
+                return await self.run(image_paths, destination, on_update=callback, **options)
+
+        tasks = [_run_one(i, paths, dest) for i, (paths, dest) in enumerate(albums)]
+        return await asyncio.gather(*tasks, return_exceptions=True)
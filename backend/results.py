@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "avif": "image/avif",
+    "jpg": "image/jpeg",
+}
+
+
+@dataclass(frozen=True)
+class CachedResult:
+    data: bytes
+    etag: str
+    content_type: str
+
+    @classmethod
+    def from_bytes(cls, data: bytes, content_type: str) -> "CachedResult":
+        # Strong validator: results are immutable, so the content hash is stable
+        return cls(data=data, etag=f'"{hashlib.sha256(data).hexdigest()}"', content_type=content_type)
+
+
+class ResultCache:
+    """
+    Size-bounded LRU of hot results held in memory.
+
+    Concurrent misses for the same key share one load, so a panel that is
+    suddenly popular is fetched from storage once.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: CachedResult):
+        # Anything larger than the whole budget is served but not kept
+        if len(entry.data) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous.data)
+        self._entries[key] = entry
+        self.size += len(entry.data)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.data)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[CachedResult]]) -> CachedResult:
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+        if key in self._loading:
+            return await asyncio.shield(self._loading[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            entry = await loader()
+            self.put(key, entry)
+            future.set_result(entry)
+            return entry
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters get the error; nobody else needs to retrieve it
+            future.exception()
+            raise
+        finally:
+            del self._loading[key]
+
+
+def parse_byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single-range "bytes=" Range header into inclusive (start, end).
+
+    Returns None when the header should be ignored (other units, multiple
+    ranges, malformed), which means the full body is served. Raises
+    ValueError when the range cannot be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    first, last = first.strip(), last.strip()
+    if not sep or not (first or last) or not (first + last).isdigit():
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Range not satisfiable")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        raise ValueError("Range not satisfiable")
+    if end < start:
+        return None
+    return start, min(end, size - 1)
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 from pydantic import BaseModel
 
 class JobStatus(str, Enum):
@@ -15,7 +15,55 @@ class JobResponse(BaseModel):
     job_id: str
     status: JobStatus
     result_url: Optional[str] = None
+    preview_url: Optional[str] = None
+    # Size-optimized variants of the result keyed by name (webp, avif, thumbnail, social)
+    derivative_urls: Optional[Dict[str, str]] = None
     error_message: Optional[str] = None
 
+class JobEventType(str, Enum):
+    STATUS = "STATUS"
+    PROGRESS = "PROGRESS"
+    ERROR = "ERROR"
+
+class JobEvent(BaseModel):
+    event_id: str
+    job_id: str
+    type: JobEventType
+    timestamp: float
+    status: Optional[JobStatus] = None
+    message: Optional[str] = None
+    progress: Optional[float] = None
+    result_url: Optional[str] = None
+    preview_url: Optional[str] = None
+    derivative_urls: Optional[Dict[str, str]] = None
+    error_message: Optional[str] = None
+
+class StageStats(BaseModel):
+    stage: JobStatus
+    count: int
+    total_seconds: float
+    mean_seconds: float
+
+AspectRatio = Literal["1:1", "2:3", "3:2", "3:4", "4:3", "4:5", "5:4", "9:16", "16:9", "21:9"]
+ImageSize = Literal["1K", "2K", "4K"]
+# "interactive" runs the job right away; "bulk" batches it with other bulk
+# jobs through the Gemini batch API for throughput rather than latency.
+Tier = Literal["interactive", "bulk"]
+
+class ModelCallStats(BaseModel):
+    stage: str
+    calls: int
+    attempts: int
+    retries: int
+    hedges: int
+    hedge_wins: int
+    failures: int
+
 class GenerateRequest(BaseModel):
-    pass # Inputs are handled via multipart/form-data, so this might be empty or used for other params
+    # Images are sent as multipart files; these are the accompanying form fields.
+    aspect_ratio: AspectRatio = "16:9"
+    image_size: ImageSize = "2K"
+    # Render a quick low-resolution panel first and publish it as preview_url.
+    # Bulk jobs leave this off to skip the extra render.
+    preview: bool = False
+    tier: Tier = "interactive"
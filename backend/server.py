@@ -2,29 +2,74 @@ import asyncio
 import os
 import uuid
 from contextlib import asynccontextmanager
-from typing import List
+from typing import List, Optional
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 from arq import create_pool
 from arq.connections import RedisSettings
 from arq.jobs import Job
 import uvicorn
 
+from bulk import BulkJobStore
 from config import settings
-from schemas import JobStatus, JobResponse
-from storage import upload_file
-from utils import configure_logging, logger
+from embedded import EmbeddedJobQueue
+from events import MemoryJobEventLog, RedisJobEventLog, TERMINAL_STATUSES
+from ingest import IngestError, ingest_upload
+from schemas import GenerateRequest, JobEvent, JobEventType, JobStatus, JobResponse, ModelCallStats, StageStats
+from derivatives import RESULT_CACHE_CONTROL
+from results import CONTENT_TYPES, CachedResult, ResultCache, parse_byte_range
+from storage import LOCAL_FILES_ROUTE, download_bytes, sweep_local_inputs, use_local_storage
+from utils import configure_logging, logger, logging_stats
 
 configure_logging()
 
+# How often local storage is swept for expired inputs
+INPUT_SWEEP_INTERVAL = 3600
+
+async def sweep_inputs_periodically():
+    """
+    Expires unused content-addressed inputs in local storage; GCS does this
+    with a bucket lifecycle rule.
+    """
+    max_age = settings.INPUT_RETENTION_DAYS * 86400
+    while True:
+        try:
+            removed = await asyncio.to_thread(sweep_local_inputs, max_age)
+            if removed:
+                logger.info("Expired local inputs", removed=removed)
+        except Exception as e:
+            logger.warning("Failed to sweep local inputs", error=str(e))
+        await asyncio.sleep(INPUT_SWEEP_INTERVAL)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    logger.info("Starting up API")
-    app.state.redis = await create_pool(RedisSettings.from_dsn(settings.REDIS_URL))
+    logger.info("Starting up API", embedded=settings.EMBEDDED_MODE, storage=settings.STORAGE_BACKEND)
+    app.state.result_cache = ResultCache(settings.RESULT_CACHE_MAX_BYTES)
+    app.state.ws_subscribers = 0
+    if settings.EMBEDDED_MODE:
+        # Jobs run in this process; no Redis, no arq worker
+        app.state.redis = None
+        app.state.events = MemoryJobEventLog()
+        app.state.queue = EmbeddedJobQueue(
+            app.state.events,
+            concurrency=settings.EMBEDDED_CONCURRENCY,
+            maxsize=settings.EMBEDDED_QUEUE_SIZE,
+        )
+        await app.state.queue.start()
+    else:
+        app.state.redis = await create_pool(RedisSettings.from_dsn(settings.REDIS_URL))
+        app.state.events = RedisJobEventLog(app.state.redis)
+    sweeper = asyncio.create_task(sweep_inputs_periodically()) if use_local_storage() else None
     yield
     logger.info("Shutting down API")
-    await app.state.redis.close()
+    if sweeper:
+        sweeper.cancel()
+    if settings.EMBEDDED_MODE:
+        await app.state.queue.stop()
+    else:
+        await app.state.redis.close()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -36,38 +81,64 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if use_local_storage():
+    os.makedirs(settings.LOCAL_STORAGE_DIR, exist_ok=True)
+    app.mount(LOCAL_FILES_ROUTE, StaticFiles(directory=settings.LOCAL_STORAGE_DIR), name="files")
+
+async def enqueue_generate(job_id: str, gcs_urls: List[str], options: GenerateRequest):
+    if options.tier == "bulk":
+        # Collected into a batch by the worker's collect_bulk_batches cron
+        await BulkJobStore(app.state.redis).add(job_id, gcs_urls, options.model_dump())
+    elif settings.EMBEDDED_MODE:
+        app.state.queue.enqueue(job_id, gcs_urls, options.model_dump())
+    else:
+        await app.state.redis.enqueue_job('generate_panel', gcs_urls, options.model_dump(), _job_id=job_id)
+
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    return {"status": "ok", "logging": logging_stats()}
 
 @app.post("/generate", response_model=JobResponse)
-async def generate(images: List[UploadFile] = File(...)):
+async def generate(request: Request):
     job_id = str(uuid.uuid4())
-    logger.info("Received generate request", job_id=job_id, num_images=len(images))
-    
-    # Upload images to GCS
-    gcs_urls = []
+
+    if settings.EMBEDDED_MODE and app.state.queue.queue.full():
+        raise HTTPException(status_code=503, detail="Job queue is full, try again later")
+
+    # Images are validated as they arrive, so bad uploads are rejected before
+    # the body is fully read and never reach the queue; inputs already in the
+    # content-addressed store are not uploaded again
     try:
-        upload_tasks = []
-        for i, img in enumerate(images):
-            ext = img.filename.split('.')[-1] if '.' in img.filename else "png"
-            blob_name = f"inputs/{job_id}/image_{i}.{ext}"
-            # We need to read the file content
-            # UploadFile exposes a SpooledTemporaryFile
-            upload_tasks.append(upload_file(img.file, blob_name, img.content_type))
-        
-        gcs_urls = await asyncio.gather(*upload_tasks)
-        
+        upload = await ingest_upload(request, job_id)
+    except IngestError as e:
+        logger.info("Rejected generate request", job_id=job_id, status_code=e.status_code, reason=e.detail)
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
-        logger.error("Failed to upload images", error=str(e))
+        logger.error("Failed to upload images", job_id=job_id, error=str(e))
         raise HTTPException(status_code=500, detail=f"Failed to upload images: {str(e)}")
 
-    # Enqueue Job
-    redis = app.state.redis
-    await redis.enqueue_job('generate_panel', gcs_urls, _job_id=job_id)
+    gcs_urls, options = upload.urls, upload.options
+    logger.info("Received generate request", job_id=job_id, num_images=len(gcs_urls), **options.model_dump())
+
+    if options.tier == "bulk" and settings.EMBEDDED_MODE:
+        raise HTTPException(status_code=422, detail="The bulk tier needs the queued deployment (Redis and an arq worker)")
+
+    # Set initial status before enqueueing, so a fast worker's first update
+    # can never be overwritten by QUEUED
+    await app.state.events.append_status(job_id, JobStatus.QUEUED)
     
-    # Set initial status
-    await redis.hset(f"job:{job_id}", mapping={"status": JobStatus.QUEUED.value})
+    # Enqueue Job
+    try:
+        await enqueue_generate(job_id, gcs_urls, options)
+    except Exception as e:
+        logger.error("Failed to enqueue job", job_id=job_id, error=str(e))
+        await app.state.events.append_status(job_id, JobStatus.FAILED, error_message="Failed to enqueue job")
+        try:
+            await app.state.events.record_stage_durations(job_id)
+        except Exception as stats_error:
+            logger.warning("Failed to record stage durations", job_id=job_id, error=str(stats_error))
+        status_code = 503 if isinstance(e, asyncio.QueueFull) else 500
+        raise HTTPException(status_code=status_code, detail="Failed to enqueue job")
     
     return JobResponse(job_id=job_id, status=JobStatus.QUEUED)
 
@@ -76,8 +147,10 @@ async def get_job_status(job_id: str):
     redis = app.state.redis
     
     # Check custom status
-    data = await redis.hgetall(f"job:{job_id}")
-    if not data:
+    snapshot = await app.state.events.snapshot(job_id)
+    if not snapshot:
+        if redis is None:
+            raise HTTPException(status_code=404, detail="Job not found")
         # Check if it exists in Arq?
         try:
             job = Job(job_id, redis)
@@ -91,55 +164,124 @@ async def get_job_status(job_id: str):
         except Exception:
              raise HTTPException(status_code=404, detail="Job not found")
 
-    status_str = data.get(b'status', b'').decode('utf-8')
-    error_msg = data.get(b'error_message', b'').decode('utf-8') if b'error_message' in data else None
-    result_url = data.get(b'result_url', b'').decode('utf-8') if b'result_url' in data else None
-    
-    return JobResponse(
-        job_id=job_id, 
-        status=JobStatus(status_str), 
-        error_message=error_msg or None,
-        result_url=result_url or None
-    )
+    return snapshot
+
+@app.get("/job/{job_id}/events", response_model=List[JobEvent])
+async def get_job_events(job_id: str, after: str = "0-0", count: Optional[int] = None):
+    """
+    Returns the job's event log after the given stream id ("0-0" for all).
+    """
+    try:
+        return await app.state.events.read(job_id, after=after, count=count)
+    except Exception as e:
+        logger.warning("Failed to read job events", job_id=job_id, error=str(e))
+        raise HTTPException(status_code=400, detail=f"Invalid event offset: {after}")
+
+@app.get("/stats/stages", response_model=List[StageStats])
+async def get_stage_stats():
+    return await app.state.events.stage_stats()
+
+@app.get("/stats/model-calls", response_model=List[ModelCallStats])
+async def get_model_call_stats():
+    return await app.state.events.model_call_stats()
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or etag in tags
+
+@app.get("/result/{job_id}")
+async def get_result(job_id: str, request: Request, variant: str = "png"):
+    """
+    Serves a finished panel (or one of its derivatives) with a strong ETag,
+    immutable caching, conditional GET and single byte-range support.
+    """
+    async def _load() -> CachedResult:
+        snapshot = await app.state.events.snapshot(job_id)
+        if not snapshot or snapshot.status != JobStatus.COMPLETED or not snapshot.result_url:
+            raise HTTPException(status_code=404, detail="Result not found")
+        if variant == "png":
+            url = snapshot.result_url
+        else:
+            url = (snapshot.derivative_urls or {}).get(variant)
+            if not url:
+                raise HTTPException(status_code=404, detail=f"Result variant not found: {variant}")
+        ext = url.rsplit(".", 1)[-1].lower()
+        data = await download_bytes(url)
+        return CachedResult.from_bytes(data, CONTENT_TYPES.get(ext, "application/octet-stream"))
+
+    result = await app.state.result_cache.get_or_load(f"{job_id}:{variant}", _load)
+    headers = {
+        "ETag": result.etag,
+        "Cache-Control": RESULT_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, result.etag):
+        return Response(status_code=304, headers=headers)
+
+    size = len(result.data)
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # A stale If-Range means the client's partial copy is outdated: send it all
+    if range_header and (not if_range or if_range == result.etag):
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range:
+            start, end = byte_range
+            return Response(
+                content=result.data[start:end + 1],
+                status_code=206,
+                media_type=result.content_type,
+                headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"},
+            )
+
+    return Response(content=result.data, media_type=result.content_type, headers=headers)
 
 @app.websocket("/ws/{job_id}")
-async def websocket_endpoint(websocket: WebSocket, job_id: str):
+async def websocket_endpoint(websocket: WebSocket, job_id: str, after: str = "0-0"):
     await websocket.accept()
-    redis = app.state.redis
-    last_status = None
+    # Each subscriber holds a Redis connection blocked in XREAD for as long as
+    # the socket is open, so their number is capped; clients past the cap are
+    # told to retry later and fall back to polling /job.
+    if app.state.ws_subscribers >= settings.WS_MAX_SUBSCRIBERS:
+        await websocket.close(code=1013, reason="Too many subscribers, poll /job instead")
+        return
+    app.state.ws_subscribers += 1
+    events = app.state.events
+    current = JobResponse(job_id=job_id, status=JobStatus.QUEUED)
     
     try:
-        while True:
-            data = await redis.hgetall(f"job:{job_id}")
-            if data:
-                status_str = data.get(b'status', b'').decode('utf-8')
-                error_msg = data.get(b'error_message', b'').decode('utf-8') if b'error_message' in data else None
-                result_url = data.get(b'result_url', b'').decode('utf-8') if b'result_url' in data else None
-                
-                current_response = JobResponse(
-                    job_id=job_id,
-                    status=JobStatus(status_str),
-                    error_message=error_msg or None,
-                    result_url=result_url or None
-                )
-                
-                if status_str != last_status:
-                    await websocket.send_text(current_response.model_dump_json())
-                    last_status = status_str
-                
-                if status_str in [JobStatus.COMPLETED.value, JobStatus.FAILED.value]:
+        # Replay the log from `after` and then follow it, so late subscribers
+        # catch up on every transition they missed.
+        finished = False
+        while not finished:
+            for event in await events.read(job_id, after=after, block_ms=5000):
+                after = event.event_id
+                if event.type != JobEventType.STATUS:
+                    continue
+                current = current.model_copy(update={
+                    "status": event.status,
+                    "result_url": event.result_url or current.result_url,
+                    "preview_url": event.preview_url or current.preview_url,
+                    "derivative_urls": event.derivative_urls or current.derivative_urls,
+                    "error_message": event.error_message or current.error_message,
+                })
+                await websocket.send_text(current.model_dump_json())
+                if event.status in TERMINAL_STATUSES:
+                    finished = True
                     break
-            else:
-                # Job not found yet?
-                pass
-            
-            await asyncio.sleep(1)
             
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected", job_id=job_id)
     except Exception as e:
         logger.error("WebSocket error", error=str(e))
         await websocket.close()
+    finally:
+        app.state.ws_subscribers -= 1
 
 def start():
     port = int(os.environ.get("PORT", 8080))
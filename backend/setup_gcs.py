@@ -4,6 +4,7 @@ from google.cloud import storage
 from google.api_core.exceptions import NotFound, Forbidden
 import requests
 from config import settings
+from storage import INPUTS_PREFIX, STAGING_PREFIX
 from utils import configure_logging, logger
 
 configure_logging()
@@ -45,13 +46,20 @@ def main():
             bucket.iam_configuration.uniform_bucket_level_access_enabled = False
             bucket.patch()
 
-        # Lifecycle Rule (24h)
+        # Lifecycle Rules
         # "Definir las reglas siempre como diccionarios puros"
+        # Everything expires after 24h except content-addressed inputs, which
+        # are shared across jobs and expire once unused (their custom time is
+        # refreshed on every reuse).
         lifecycle_rules = [
             {
                 "action": {"type": "Delete"},
-                "condition": {"age": 1}
-            }
+                "condition": {"age": 1, "matchesPrefix": ["outputs/", STAGING_PREFIX]}
+            },
+            {
+                "action": {"type": "Delete"},
+                "condition": {"daysSinceCustomTime": settings.INPUT_RETENTION_DAYS, "matchesPrefix": [INPUTS_PREFIX]}
+            },
         ]
         bucket.lifecycle_rules = lifecycle_rules
         bucket.patch()
@@ -1,62 +1,227 @@
 import asyncio
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Tuple
+from google.api_core.exceptions import NotFound, PreconditionFailed
 from google.cloud import storage
 from config import settings
-from utils import logger
 import os
 
+# Mount point for the local backend's files on the API (see server.py)
+LOCAL_FILES_ROUTE = "/files"
+
 def get_client():
     return storage.Client(project=settings.PROJECT_ID)
 
-async def upload_file(file_obj, destination_blob_name: str, content_type: str) -> str:
+def use_local_storage() -> bool:
+    return settings.STORAGE_BACKEND == "local"
+
+def public_url_prefix() -> str:
+    if use_local_storage():
+        return f"{settings.API_URL.rstrip('/')}{LOCAL_FILES_ROUTE}/"
+    return f"https://storage.googleapis.com/{settings.BUCKET_NAME}/"
+
+def blob_name_from_url(url: str) -> str:
+    prefix = public_url_prefix()
+    if not url.startswith(prefix):
+        raise ValueError(f"Invalid storage URL: {url}")
+    return url[len(prefix):]
+
+def local_path(blob_name: str) -> Path:
+    """
+    Maps a blob name to a path under LOCAL_STORAGE_DIR, refusing names that
+    would escape it.
+    """
+    root = Path(settings.LOCAL_STORAGE_DIR).resolve()
+    path = (root / blob_name).resolve()
+    if root not in path.parents:
+        raise ValueError(f"Invalid blob name: {blob_name}")
+    return path
+
+def _write_local(destination_blob_name: str, write) -> str:
+    path = local_path(destination_blob_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.part")
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+    return public_url_prefix() + destination_blob_name
+
+async def upload_bytes(data: bytes, destination_blob_name: str, content_type: str, cache_control: str = None) -> str:
     """
-    Uploads a file-like object to GCS and makes it public.
+    Uploads in-memory bytes to GCS and makes them public.
     Returns the public URL.
     """
+    if use_local_storage():
+        return await asyncio.to_thread(_write_local, destination_blob_name, lambda f: f.write(data))
+
     client = get_client()
     bucket = client.bucket(settings.BUCKET_NAME)
     blob = bucket.blob(destination_blob_name)
+    if cache_control:
+        blob.cache_control = cache_control
 
     def _upload():
-        blob.upload_from_file(file_obj, content_type=content_type)
+        blob.upload_from_string(data, content_type=content_type)
         blob.make_public()
         return blob.public_url
 
     return await asyncio.to_thread(_upload)
 
-async def upload_from_filename(filename: str, destination_blob_name: str, content_type: str = None) -> str:
+# Content-addressed inputs, shared across jobs: inputs/sha256/{digest}.{ext}.
+# They are never deleted by jobs; each reuse refreshes the blob's custom time
+# and the bucket lifecycle (see setup_gcs.py) expires ones unused for
+# INPUT_RETENTION_DAYS.
+INPUTS_PREFIX = "inputs/sha256/"
+# Where POST /generate streams an input before its hash is known; leftovers
+# of interrupted requests expire with the bucket's 1-day age rule
+STAGING_PREFIX = "inputs/staging/"
+# Reuse refreshes retention at most this often, so hot inputs aren't patched on every job
+RETENTION_REFRESH = timedelta(days=1)
+# Resumable upload chunk size; must be a multiple of 256 KiB. Bounds the
+# memory an in-progress streaming upload holds.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def input_blob_name(digest: str, ext: str) -> str:
+    return f"{INPUTS_PREFIX}{digest}.{ext}"
+
+def staging_blob_name(job_id: str, index: int) -> str:
+    return f"{STAGING_PREFIX}{job_id}/image_{index}"
+
+class StagedInput:
     """
-    Uploads a file from disk to GCS and makes it public.
-    Returns the public URL.
+    One input streamed to storage as it arrives, under a staging name, since
+    its content-addressed name is only known once all of it has been hashed.
+    With GCS the bytes go straight into a resumable upload, so a request never
+    holds whole images (Cloud Run's /tmp is in memory); with local storage
+    they are spooled to a temporary file.
+
+    write() the chunks, finish() once the part is complete, then commit() to
+    store it under its final name or discard() to drop it.
     """
-    client = get_client()
-    bucket = client.bucket(settings.BUCKET_NAME)
-    blob = bucket.blob(destination_blob_name)
 
-    def _upload():
-        blob.upload_from_filename(filename, content_type=content_type)
-        blob.make_public()
-        return blob.public_url
+    def __init__(self, staging_blob_name: str, content_type: str):
+        self.content_type = content_type
+        self._file = None
+        self._blob = None
+        self._staged = False
+        if use_local_storage():
+            self._file = tempfile.TemporaryFile()
+        else:
+            self._blob = get_client().bucket(settings.BUCKET_NAME).blob(staging_blob_name)
 
-    return await asyncio.to_thread(_upload)
+    async def write(self, chunk: bytes):
+        if self._file is None:
+            # Opening the resumable session is a network call
+            self._file = await asyncio.to_thread(
+                self._blob.open, "wb", content_type=self.content_type, chunk_size=UPLOAD_CHUNK_SIZE
+            )
+        await asyncio.to_thread(self._file.write, chunk)
+
+    async def finish(self):
+        if self._blob is None:
+            return
+
+        def _finish():
+            if self._file is None:
+                self._blob.upload_from_string(b"", content_type=self.content_type)
+            else:
+                self._file.close()
+
+        await asyncio.to_thread(_finish)
+        self._file = None
+        self._staged = True
+
+    async def commit(self, destination_blob_name: str) -> Tuple[str, bool]:
+        """
+        Stores the input as `destination_blob_name` unless a blob with that
+        name already exists, refreshing the existing blob's retention instead.
+        The staged copy is dropped either way.
+        Returns the public URL and whether anything was stored.
+        """
+        try:
+            if self._blob is None:
+                return await asyncio.to_thread(self._commit_local, destination_blob_name)
+            return await asyncio.to_thread(self._commit, destination_blob_name)
+        finally:
+            await self.discard()
+
+    def _commit_local(self, destination_blob_name: str) -> Tuple[str, bool]:
+        path = local_path(destination_blob_name)
+        if path.exists():
+            os.utime(path)
+            return public_url_prefix() + destination_blob_name, False
+        self._file.seek(0)
+        return _write_local(destination_blob_name, lambda f: shutil.copyfileobj(self._file, f)), True
+
+    def _commit(self, destination_blob_name: str) -> Tuple[str, bool]:
+        blob = self._blob.bucket.blob(destination_blob_name)
+        now = datetime.now(timezone.utc)
+        try:
+            blob.reload()
+        except NotFound:
+            blob.content_type = self.content_type
+            blob.custom_time = now
+            try:
+                # Server-side copy; two requests racing on the same content store it at most once
+                token, _, _ = blob.rewrite(self._blob, if_generation_match=0)
+                while token is not None:
+                    token, _, _ = blob.rewrite(self._blob, token=token, if_generation_match=0)
+            except PreconditionFailed:
+                return blob.public_url, False
+            blob.make_public()
+            return blob.public_url, True
+        if blob.custom_time is None or now - blob.custom_time > RETENTION_REFRESH:
+            blob.custom_time = now
+            blob.patch()
+        return blob.public_url, False
+
+    async def discard(self):
+        if self._blob is None:
+            self._file.close()
+            return
+        # An unfinished resumable session is never committed; it expires on its own
+        self._file = None
+        if self._staged:
+            self._staged = False
+            try:
+                await asyncio.to_thread(self._blob.delete)
+            except Exception:
+                # Best effort: leftovers expire with the bucket's age rule
+                pass
+
+def sweep_local_inputs(max_age_seconds: float) -> int:
+    """
+    Local-storage counterpart of the bucket lifecycle rule: deletes
+    content-addressed inputs not used for `max_age_seconds`.
+    Returns the number of files removed.
+    """
+    root = local_path(INPUTS_PREFIX.rstrip("/"))
+    if not root.is_dir():
+        return 0
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for entry in os.scandir(root):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
 
 async def download_file(gcs_url: str, destination_path: str):
     """
     Downloads a file from a GCS URL to a local path.
     Assumes URL structure: https://storage.googleapis.com/BUCKET_NAME/BLOB_NAME
     """
-    # Parse blob name from URL
-    # Example: https://storage.googleapis.com/panel-one-outputs/inputs/123/image.png
-    # or https://storage.googleapis.com/download/storage/v1/b/panel-one-outputs/o/inputs%2F123%2Fimage.png...
-    
-    # Simple parsing assuming standard public URL format
-    prefix = f"https://storage.googleapis.com/{settings.BUCKET_NAME}/"
-    if not gcs_url.startswith(prefix):
-        # Fallback for other URL formats if necessary, or assume it's just the blob path if passed internally?
-        # The spec says "URLs de GCS".
-        # Let's try to handle the standard public URL.
-        raise ValueError(f"Invalid GCS URL: {gcs_url}")
-
-    blob_name = gcs_url[len(prefix):]
+    blob_name = blob_name_from_url(gcs_url)
+    if use_local_storage():
+        await asyncio.to_thread(shutil.copyfile, local_path(blob_name), destination_path)
+        return
     
     client = get_client()
     bucket = client.bucket(settings.BUCKET_NAME)
@@ -67,24 +232,16 @@ async def download_file(gcs_url: str, destination_path: str):
 
     await asyncio.to_thread(_download)
 
-async def delete_file(gcs_url: str):
+async def download_bytes(gcs_url: str) -> bytes:
     """
-    Deletes a file from GCS given its URL.
+    Downloads a file from a storage URL into memory.
     """
-    prefix = f"https://storage.googleapis.com/{settings.BUCKET_NAME}/"
-    if not gcs_url.startswith(prefix):
-        logger.warning("Skipping delete, invalid URL", url=gcs_url)
-        return
+    blob_name = blob_name_from_url(gcs_url)
+    if use_local_storage():
+        return await asyncio.to_thread(local_path(blob_name).read_bytes)
 
-    blob_name = gcs_url[len(prefix):]
     client = get_client()
     bucket = client.bucket(settings.BUCKET_NAME)
     blob = bucket.blob(blob_name)
 
-    def _delete():
-        try:
-            blob.delete()
-        except Exception as e:
-            logger.warning("Failed to delete blob", blob=blob_name, error=str(e))
-
-    await asyncio.to_thread(_delete)
+    return await asyncio.to_thread(blob.download_as_bytes)
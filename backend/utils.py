@@ -1,11 +1,207 @@
 import structlog
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import orjson
+
+from config import settings
+
+# Counters for the queue-backed pipeline, reported by logging_stats()
+_stats = {"written": 0, "dropped": 0, "sampled": 0}
+
+def _dumps(event_dict: dict) -> bytes:
+    return orjson.dumps(event_dict, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+def _iso(ts: float) -> str:
+    # Same format as structlog's TimeStamper(fmt="iso")
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+def _capture_time(logger, method_name, event_dict):
+    # Only the raw clock is read on the caller; formatting happens off-thread
+    event_dict["timestamp"] = time.time()
+    return event_dict
+
+class EventSampler:
+    """
+    Rate-limits high-frequency events per (logger, event) pair: at most
+    `burst` INFO/DEBUG events per `window` seconds get through, the rest are
+    dropped and counted. Warnings and errors are never sampled.
+    """
+
+    def __init__(self, burst: int, window: float = 1.0):
+        self.burst = burst
+        self.window = window
+        self._windows = {}
+
+    def __call__(self, logger, method_name, event_dict):
+        if method_name not in ("debug", "info"):
+            return event_dict
+        key = (event_dict.get("logger"), event_dict.get("event"))
+        now = time.monotonic()
+        started, count = self._windows.get(key, (now, 0))
+        if now - started >= self.window:
+            started, count = now, 0
+        self._windows[key] = (started, count + 1)
+        if count >= self.burst:
+            _stats["sampled"] += 1
+            raise structlog.DropEvent
+        return event_dict
+
+class QueueRenderer:
+    """
+    Final structlog processor that hands event dicts to a background thread,
+    which renders them as JSON and writes them to the stream in batches.
+    The caller never blocks: when the queue is full the event is dropped and
+    counted.
+    """
+
+    def __init__(self, stream, maxsize: int, stats_interval: float):
+        self.stream = stream
+        self.stats_interval = stats_interval
+        self.queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def __call__(self, logger, method_name, event_dict):
+        try:
+            self.queue.put_nowait(event_dict)
+        except queue.Full:
+            _stats["dropped"] += 1
+        raise structlog.DropEvent
+
+    def _render(self, event_dict: dict) -> bytes:
+        event_dict["timestamp"] = _iso(event_dict["timestamp"])
+        for key, value in event_dict.items():
+            if isinstance(value, bytes):
+                event_dict[key] = value.decode("utf-8", "replace")
+        return _dumps(event_dict)
+
+    def _report(self, reported: dict) -> dict:
+        # Emit a stats line whenever logs were dropped or sampled since the last one
+        current = dict(_stats)
+        if current["dropped"] != reported["dropped"] or current["sampled"] != reported["sampled"]:
+            line = _dumps({
+                "event": "Logging stats",
+                "logger": "utils",
+                "level": "warning" if current["dropped"] != reported["dropped"] else "info",
+                "timestamp": _iso(time.time()),
+                "dropped": current["dropped"] - reported["dropped"],
+                "sampled": current["sampled"] - reported["sampled"],
+                **{f"total_{k}": v for k, v in current.items()},
+            })
+            self._write([line])
+        return current
+
+    def _write(self, lines):
+        out = getattr(self.stream, "buffer", None)
+        data = b"\n".join(lines) + b"\n"
+        if out is not None:
+            out.write(data)
+        else:
+            self.stream.write(data.decode("utf-8"))
+        self.stream.flush()
+
+    def _run(self):
+        reported = dict(_stats)
+        next_report = time.monotonic() + self.stats_interval
+        while True:
+            try:
+                event_dict = self.queue.get(timeout=self.stats_interval)
+            except queue.Empty:
+                event_dict = None
+            if event_dict is not None:
+                batch = [event_dict]
+                while len(batch) < 256:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                lines = []
+                for item in batch:
+                    try:
+                        lines.append(self._render(item))
+                    except Exception as e:
+                        lines.append(_dumps({"event": "Failed to render log event", "error": str(e)}))
+                self._write(lines)
+                _stats["written"] += len(lines)
+            if time.monotonic() >= next_report:
+                reported = self._report(reported)
+                next_report = time.monotonic() + self.stats_interval
+
+    def close(self, timeout: float = 2.0):
+        """
+        Gives the writer a moment to drain the queue at exit.
+        """
+        deadline = time.monotonic() + timeout
+        while not self.queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _stats["dropped"] += 1
+
+def logging_stats() -> dict:
+    return dict(_stats)
 
 def configure_logging():
     """
     Configures structlog to output JSON for Cloud Run.
+
+    In "queue" mode (LOG_MODE) rendering and writing happen on a background
+    thread so logging never blocks the event loop; "sync" keeps the plain
+    synchronous pipeline.
     """
+    if settings.LOG_MODE == "sync":
+        _configure_sync_logging()
+        return
+
+    # Third-party stdlib loggers go through a queue as well
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    stdout_handler.setFormatter(logging.Formatter("%(message)s"))
+    record_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    listener = logging.handlers.QueueListener(record_queue, stdout_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    # QueueHandler.prepare() pre-formats records, so it needs the plain
+    # message format; otherwise basicConfig would give it BASIC_FORMAT
+    queue_handler = _DroppingQueueHandler(record_queue)
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(
+        level=logging.INFO,
+        handlers=[queue_handler],
+        force=True,
+    )
+
+    structlog.configure(
+        processors=[
+            structlog.stdlib.filter_by_level,
+            structlog.stdlib.add_logger_name,
+            structlog.stdlib.add_log_level,
+            EventSampler(burst=settings.LOG_SAMPLE_BURST, window=settings.LOG_SAMPLE_WINDOW),
+            structlog.stdlib.PositionalArgumentsFormatter(),
+            _capture_time,
+            # Stack and exception info only exist on the calling thread
+            structlog.processors.StackInfoRenderer(),
+            structlog.processors.format_exc_info,
+            QueueRenderer(sys.stdout, maxsize=settings.LOG_QUEUE_SIZE, stats_interval=settings.LOG_STATS_INTERVAL),
+        ],
+        context_class=dict,
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+
+def _configure_sync_logging():
     logging.basicConfig(
         format="%(message)s",
         stream=sys.stdout,
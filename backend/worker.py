@@ -1,29 +1,70 @@
 import asyncio
+import json
 import os
 import shutil
+import tempfile
+import time
 import uuid
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 import traceback
 
-from arq import Worker
+from arq import Worker, cron
 from arq.connections import RedisSettings
 from google import genai
 from google.genai import types
 from PIL import Image
 
+from bulk import (
+    BULK_JOB_TTL_SECONDS,
+    STAGES,
+    BatchFailed,
+    BulkJobStore,
+    GeminiBatchBackend,
+    LocalBatchBackend,
+    image_part,
+    request_line,
+    response_image,
+    response_text,
+)
 from config import settings
-from schemas import JobStatus
-from storage import download_file, upload_from_filename, delete_file
+from events import RedisJobEventLog, TERMINAL_STATUSES
+from model_calls import CallStats, Deadline, LatencyTracker, call_model
+from schemas import GenerateRequest, JobEventType, JobStatus
+from derivatives import RESULT_CACHE_CONTROL, publish_derivatives
+from input_cache import InputCache
+from storage import download_file, upload_bytes, use_local_storage
 from utils import logger
 
 # Constants
 STORY_MODEL = "gemini-3-pro-preview"
 IMAGE_MODEL = "gemini-3-pro-image-preview"
+PREVIEW_IMAGE_SIZE = "1K"
+
+JOB_TIMEOUT = 590
+# Time kept back from the job budget for status updates and cleanup
+DEADLINE_MARGIN = 15
+# Time kept back from the model stages for uploading the result
+UPLOAD_RESERVE = 30
+# The story may use at most this share of the budget left after the reserve,
+# so a slow story call can't starve the image stage.
+STORY_BUDGET_SHARE = 0.4
+HEDGE_PERCENTILE = 95
 
 async def startup(ctx):
     logger.info("Worker starting up")
     ctx['gemini_client'] = genai.Client(api_key=settings.GEMINI_API_KEY)
+    # Embedded mode provides its own in-memory event log
+    if 'events' not in ctx:
+        ctx['events'] = RedisJobEventLog(ctx['redis'])
+    ctx['story_latency'] = LatencyTracker()
+    if settings.BULK_BATCH_BACKEND == "local":
+        ctx['batch_backend'] = LocalBatchBackend(Path(settings.BULK_LOCAL_BATCH_DIR), delay=settings.BULK_LOCAL_BATCH_DELAY)
+    else:
+        ctx['batch_backend'] = GeminiBatchBackend(ctx['gemini_client'])
+    # Local storage is already on this disk, so only GCS inputs are cached
+    if 'input_cache' not in ctx and not use_local_storage():
+        ctx['input_cache'] = InputCache(Path(settings.INPUT_CACHE_DIR), settings.INPUT_CACHE_MAX_BYTES)
     # We can also store the redis pool if needed, but ctx['redis'] is available if using Arq's pool?
     # Arq passes a redis connection in ctx? No, ctx['redis'] is usually the pool if configured.
     # Actually Arq creates the pool.
@@ -32,61 +73,188 @@ async def startup(ctx):
 async def shutdown(ctx):
     logger.info("Worker shutting down")
 
-async def update_job_status(ctx, job_id: str, status: JobStatus, result_url: str = None, error_message: str = None):
-    redis = ctx['redis']
-    # We store status in a separate key or hash to allow the API to query it easily
-    # alongside the Arq job status.
-    # Let's use a hash: job:{job_id} -> {status: ..., error: ...}
-    key = f"job:{job_id}"
-    data = {"status": status.value}
-    if error_message:
-        data["error_message"] = error_message
-    if result_url:
-        data["result_url"] = result_url
-    
-    await redis.hset(key, mapping=data)
-    # Set expire to clean up eventually (e.g., 24h)
-    await redis.expire(key, 86400)
+async def update_job_status(ctx, job_id: str, status: JobStatus, result_url: str = None, error_message: str = None, preview_url: str = None, derivative_urls: dict = None):
+    events: RedisJobEventLog = ctx['events']
+    # Error event, snapshot hash, status event and their TTLs go out in one pipelined call
+    await events.append_status(
+        job_id,
+        status,
+        result_url=result_url,
+        preview_url=preview_url,
+        derivative_urls=derivative_urls,
+        error_message=error_message,
+    )
     logger.info("Job status updated", job_id=job_id, status=status.value)
 
-async def generate_panel(ctx, images_urls: List[str]):
+    if status in TERMINAL_STATUSES:
+        try:
+            durations = await events.record_stage_durations(job_id)
+            logger.info("Job stage durations", job_id=job_id, durations=durations)
+        except Exception as e:
+            logger.warning("Failed to record stage durations", job_id=job_id, error=str(e))
+
+async def record_job_progress(ctx, job_id: str, message: str, progress: float = None):
+    events: RedisJobEventLog = ctx['events']
+    await events.append(job_id, JobEventType.PROGRESS, message=message, progress=progress)
+
+async def _generate_image(
+    client: genai.Client,
+    contents: list,
+    aspect_ratio: str,
+    image_size: str,
+    deadline: Deadline,
+    stats: CallStats,
+    max_attempts: int,
+) -> bytes:
+    image_config = types.ImageConfig(
+        aspect_ratio=aspect_ratio,
+        image_size=image_size
+    )
+    
+    def _call_image():
+        return client.aio.models.generate_content(
+            model=IMAGE_MODEL,
+            contents=contents,
+            config=types.GenerateContentConfig(
+                image_config=image_config
+            )
+        )
+
+    response_image = await call_model(
+        _call_image,
+        deadline=deadline,
+        stage_timeout=deadline.stage_timeout(reserve=UPLOAD_RESERVE),
+        stats=stats,
+        max_attempts=max_attempts,
+    )
+    
+    # Extract image
+    if response_image.candidates and response_image.candidates[0].content.parts:
+        for part in response_image.candidates[0].content.parts:
+            if part.inline_data:
+                return part.inline_data.data
+    
+    raise ValueError("No image data found in response")
+
+async def _report_call_stats(ctx, job_id: str, call_stats: dict):
+    """
+    Logs the job's retry/hedge counters, adds them to the job's event log and
+    folds them into the aggregate model-call stats.
+    """
+    counters = {stage: stats.as_dict() for stage, stats in call_stats.items() if stats.calls}
+    if not counters:
+        return
+    logger.info("Model call stats", job_id=job_id, **counters)
+    try:
+        summary = ", ".join(
+            f"{stage}: {c['attempts']} attempts, {c['retries']} retries, {c['hedges']} hedges"
+            for stage, c in counters.items()
+        )
+        await record_job_progress(ctx, job_id, f"Model calls - {summary}")
+        events: RedisJobEventLog = ctx['events']
+        for stage, c in counters.items():
+            await events.record_model_call_stats(stage, c)
+    except Exception as e:
+        logger.warning("Failed to record model call stats", job_id=job_id, error=str(e))
+
+async def _publish_preview(ctx, job_id: str, preview_task: asyncio.Task, final_task: asyncio.Task):
+    """
+    Publishes the low-resolution preview as soon as it is ready, unless the
+    final render beats it. Preview failures never fail the job.
+    """
+    done, _ = await asyncio.wait({preview_task, final_task}, return_when=asyncio.FIRST_COMPLETED)
+    if final_task in done:
+        logger.info("Final image ready before preview, skipping preview", job_id=job_id)
+        return
+    try:
+        preview_bytes = preview_task.result()
+        preview_url = await upload_bytes(
+            preview_bytes,
+            f"outputs/{job_id}/preview.png",
+            content_type="image/png",
+            cache_control=RESULT_CACHE_CONTROL
+        )
+        await update_job_status(ctx, job_id, JobStatus.GENERATING_IMAGE, preview_url=preview_url)
+    except Exception as e:
+        logger.warning("Preview generation failed", job_id=job_id, error=str(e))
+
+async def _publish_result(job_id: str, image_bytes: bytes):
+    """
+    Uploads the final panel and its derivatives. The PNG goes straight from
+    memory; derivatives are rendered and uploaded alongside it.
+    Returns (result_url, derivative_urls).
+    """
+    return await asyncio.gather(
+        upload_bytes(
+            image_bytes,
+            f"outputs/{job_id}/panel.png",
+            content_type="image/png",
+            cache_control=RESULT_CACHE_CONTROL
+        ),
+        publish_derivatives(job_id, image_bytes),
+    )
+
+async def _download_inputs(ctx, job_id: str, images_urls: List[str], directory: Path, timeout: float) -> List[Path]:
+    """
+    Downloads a job's inputs into `directory`, through the input cache when there is one.
+    """
+    input_cache: InputCache = ctx.get('input_cache')
+    local_images = []
+    download_tasks = []
+    for i, url in enumerate(images_urls):
+        ext = url.split('.')[-1]
+        dest = directory / f"input_{i}.{ext}"
+        local_images.append(dest)
+        if input_cache:
+            download_tasks.append(input_cache.fetch(url, dest))
+        else:
+            download_tasks.append(download_file(url, str(dest)))
+
+    await asyncio.wait_for(asyncio.gather(*download_tasks), timeout=timeout)
+    if input_cache:
+        logger.info("Input cache", job_id=job_id, hits=input_cache.hits, misses=input_cache.misses, size=input_cache.size)
+    return local_images
+
+def _load_images(paths: List[Path]) -> List[Image.Image]:
+    """
+    Verifies and fully decodes the inputs, skipping any that are invalid.
+    """
+    images = []
+    for img_path in paths:
+        try:
+            with Image.open(img_path) as img:
+                img.verify()
+            
+            # Re-open for use
+            img = Image.open(img_path)
+            img.load()
+            images.append(img)
+        except Exception as e:
+            logger.warning("Invalid image", path=str(img_path), error=str(e))
+            # Script logic: "skipping". If no valid images, the job fails.
+    return images
+
+async def generate_panel(ctx, images_urls: List[str], options: dict = None):
     job_id = ctx['job_id']
-    logger.info("Starting generate_panel", job_id=job_id, num_images=len(images_urls))
+    options = GenerateRequest(**(options or {}))
+    logger.info("Starting generate_panel", job_id=job_id, num_images=len(images_urls), **options.model_dump())
+    deadline = Deadline(JOB_TIMEOUT - DEADLINE_MARGIN)
+    call_stats = {"story": CallStats(), "image": CallStats(), "preview": CallStats()}
     
     await update_job_status(ctx, job_id, JobStatus.PROCESSING_IMAGES)
     
     tmp_dir = Path(f"/tmp/{job_id}")
     tmp_dir.mkdir(parents=True, exist_ok=True)
     
-    local_images = []
-    
     try:
         # 1. Download Images
-        download_tasks = []
-        for i, url in enumerate(images_urls):
-            ext = url.split('.')[-1]
-            dest = tmp_dir / f"input_{i}.{ext}"
-            local_images.append(dest)
-            download_tasks.append(download_file(url, str(dest)))
-        
-        # Timeout 60s for downloads
-        await asyncio.wait_for(asyncio.gather(*download_tasks), timeout=60.0)
+        # Timeout 60s for downloads, never past the job deadline
+        local_images = await _download_inputs(ctx, job_id, images_urls, tmp_dir, timeout=min(60.0, deadline.remaining()))
+        await record_job_progress(ctx, job_id, f"Downloaded {len(local_images)} images", progress=1.0)
         
         # Validate Images
-        valid_pil_images = []
-        for img_path in local_images:
-            try:
-                with Image.open(img_path) as img:
-                    img.verify()
-                
-                # Re-open for use
-                img = Image.open(img_path)
-                img.load()
-                valid_pil_images.append(img)
-            except Exception as e:
-                logger.warning("Invalid image", path=str(img_path), error=str(e))
-                # We continue if at least one is valid? Or fail?
-                # Script logic: "skipping". If no valid images, raise.
+        # Decoding is CPU-bound; off the loop so embedded mode doesn't stall the API
+        valid_pil_images = await asyncio.to_thread(_load_images, local_images)
         
         if not valid_pil_images:
             raise ValueError("No valid images found")
@@ -103,17 +271,25 @@ async def generate_panel(ctx, images_urls: List[str]):
         
         contents_story = [story_prompt] + valid_pil_images
         
-        # Async call to Gemini? The SDK v1 might be sync or async.
-        # client.models.generate_content is sync?
-        # "Envolver llamadas IO (GCS/GenAI) en asyncio.to_thread"
-        
         def _call_story():
-            return client.models.generate_content(
+            return client.aio.models.generate_content(
                 model=STORY_MODEL,
                 contents=contents_story
             )
-            
-        response_story = await asyncio.to_thread(_call_story)
+        
+        # Hedge only once enough latencies have been observed to know the p95
+        story_latency: LatencyTracker = ctx['story_latency']
+        hedge_after = story_latency.percentile(HEDGE_PERCENTILE) if settings.GEMINI_HEDGE_STORY else None
+        
+        response_story = await call_model(
+            _call_story,
+            deadline=deadline,
+            stage_timeout=deadline.stage_timeout(share=STORY_BUDGET_SHARE, reserve=UPLOAD_RESERVE),
+            stats=call_stats["story"],
+            max_attempts=settings.GEMINI_MAX_ATTEMPTS,
+            hedge_after=hedge_after,
+            latency=story_latency,
+        )
         story_text = response_story.text
         
         # 3. Generate Image
@@ -122,56 +298,36 @@ async def generate_panel(ctx, images_urls: List[str]):
         combined_text = f"{imagegen_prompt}\n\nCONTEXT (STORY):\n{story_text}"
         contents_image = [combined_text] + valid_pil_images
         
-        image_config = types.ImageConfig(
-            aspect_ratio="16:9",
-            image_size="2K"
-        )
-        
-        def _call_image():
-            return client.models.generate_content(
-                model=IMAGE_MODEL,
-                contents=contents_image,
-                config=types.GenerateContentConfig(
-                    image_config=image_config
-                )
-            )
-
-        response_image = await asyncio.to_thread(_call_image)
-        
-        # Extract image
-        generated_image_bytes = None
-        if response_image.candidates and response_image.candidates[0].content.parts:
-            for part in response_image.candidates[0].content.parts:
-                if part.inline_data:
-                    generated_image_bytes = part.inline_data.data
-                    break
+        # Progressive mode: the preview and the final render run side by side,
+        # so the preview adds no latency to the final panel.
+        final_task = asyncio.create_task(_generate_image(
+            client, contents_image, options.aspect_ratio, options.image_size,
+            deadline, call_stats["image"], settings.GEMINI_MAX_ATTEMPTS,
+        ))
+        preview_task = None
+        if options.preview and options.image_size != PREVIEW_IMAGE_SIZE:
+            # The preview is best-effort, so it never retries
+            preview_task = asyncio.create_task(_generate_image(
+                client, contents_image, options.aspect_ratio, PREVIEW_IMAGE_SIZE,
+                deadline, call_stats["preview"], 1,
+            ))
         
-        if not generated_image_bytes:
-            raise ValueError("No image data found in response")
-            
-        # Save to tmp
-        output_path = tmp_dir / "output.png"
-        # Write bytes
-        with open(output_path, "wb") as f:
-            f.write(generated_image_bytes)
+        try:
+            if preview_task:
+                await _publish_preview(ctx, job_id, preview_task, final_task)
+            generated_image_bytes = await final_task
+        finally:
+            for task in (preview_task, final_task):
+                if task and not task.done():
+                    task.cancel()
             
         # 4. Upload Result
         await update_job_status(ctx, job_id, JobStatus.UPLOADING)
+        result_url, derivative_urls = await _publish_result(job_id, generated_image_bytes)
         
-        result_url = await upload_from_filename(
-            str(output_path), 
-            f"outputs/{job_id}/panel.png", 
-            content_type="image/png"
-        )
-        
-        # 5. Cleanup Input Files (GCS)
-        # "Elimina archivos de input de GCS tras completar o fallar"
-        # We do this in finally block or here?
-        # Let's do it here for success path, and catch block for failure path.
-        cleanup_tasks = [delete_file(url) for url in images_urls]
-        await asyncio.gather(*cleanup_tasks)
-        
-        await update_job_status(ctx, job_id, JobStatus.COMPLETED, result_url)
+        # Inputs are content-addressed and may be shared with other jobs, so
+        # they are left to retention (INPUT_RETENTION_DAYS) rather than deleted
+        await update_job_status(ctx, job_id, JobStatus.COMPLETED, result_url, derivative_urls=derivative_urls)
         return result_url
 
     except Exception as e:
@@ -179,13 +335,6 @@ async def generate_panel(ctx, images_urls: List[str]):
         error_msg = str(e)
         await update_job_status(ctx, job_id, JobStatus.FAILED, error_message=error_msg)
         
-        # Attempt cleanup on failure too
-        try:
-            cleanup_tasks = [delete_file(url) for url in images_urls]
-            await asyncio.gather(*cleanup_tasks)
-        except Exception:
-            pass
-            
         # Return error info so Arq knows it failed (though we handled it gracefully for our status)
         # Spec: "El worker debe capturar excepciones y retornarlas en el resultado del job"
         # If we raise, Arq marks it as failed.
@@ -194,14 +343,235 @@ async def generate_panel(ctx, images_urls: List[str]):
         return {"error": error_msg}
         
     finally:
+        await _report_call_stats(ctx, job_id, call_stats)
         # Cleanup local tmp
         if tmp_dir.exists():
             shutil.rmtree(tmp_dir)
 
+# Bulk tier: jobs submitted with tier=bulk skip generate_panel. Their story
+# and image requests are collected into Gemini batch jobs on a schedule, and
+# the results are fanned back out to each job's status and artifacts.
+BULK_CRON_TIMEOUT = 3000
+BULK_DOWNLOAD_TIMEOUT = 120
+
+async def _bulk_request(ctx, store: BulkJobStore, stage: str, job_id: str, directory: Path, prompts: dict) -> dict:
+    """
+    Builds the batch input line for one job's story or image request.
+    """
+    job = await store.get(job_id)
+    if job is None:
+        raise ValueError("Bulk job state expired")
+    options = GenerateRequest(**job["options"])
+    job_dir = directory / job_id
+    job_dir.mkdir()
+    paths = await _download_inputs(ctx, job_id, job["images_urls"], job_dir, timeout=BULK_DOWNLOAD_TIMEOUT)
+
+    image_parts = []
+    for path in paths:
+        try:
+            image_parts.append(await asyncio.to_thread(image_part, path))
+        except Exception as e:
+            logger.warning("Invalid image", path=str(path), error=str(e))
+    if not image_parts:
+        raise ValueError("No valid images found")
+
+    if stage == "story":
+        return request_line(job_id, [{"text": prompts["story"]}] + image_parts)
+    combined_text = f"{prompts['imagegen']}\n\nCONTEXT (STORY):\n{job['story']}"
+    return request_line(
+        job_id,
+        [{"text": combined_text}] + image_parts,
+        {"image_config": {"aspect_ratio": options.aspect_ratio, "image_size": options.image_size}},
+    )
+
+async def _fail_taken_bulk_job(ctx, store: BulkJobStore, stage: str, job_id: str, error_message: str):
+    await update_job_status(ctx, job_id, JobStatus.FAILED, error_message=error_message)
+    await store.finish_job(job_id)
+    await store.drop_inflight(stage, [job_id])
+
+async def _submit_bulk_stage(ctx, store: BulkJobStore, stage: str, prompts: dict):
+    backend = ctx['batch_backend']
+    model = STORY_MODEL if stage == "story" else IMAGE_MODEL
+    status = JobStatus.GENERATING_STORY if stage == "story" else JobStatus.GENERATING_IMAGE
+    while True:
+        job_ids = await store.take_pending(stage, settings.BULK_BATCH_MAX_JOBS)
+        if not job_ids:
+            return
+        tmp_dir = Path(tempfile.mkdtemp(prefix="panel-one-bulk-"))
+        included = []
+        size = 0
+        try:
+            # Written line by line, so only one job's images are in memory at a time
+            requests_path = tmp_dir / "requests.jsonl"
+            with open(requests_path, "wb") as f:
+                for i, job_id in enumerate(job_ids):
+                    try:
+                        if stage == "story":
+                            await update_job_status(ctx, job_id, JobStatus.PROCESSING_IMAGES)
+                        line = await _bulk_request(ctx, store, stage, job_id, tmp_dir, prompts)
+                    except Exception as e:
+                        logger.warning("Bulk job failed to prepare", job_id=job_id, stage=stage, error=str(e))
+                        await _fail_taken_bulk_job(ctx, store, stage, job_id, str(e))
+                        continue
+                    data = (json.dumps(line) + "\n").encode("utf-8")
+                    shutil.rmtree(tmp_dir / job_id)
+                    if size + len(data) > settings.BULK_BATCH_MAX_BYTES:
+                        if not included:
+                            await _fail_taken_bulk_job(
+                                ctx, store, stage, job_id, f"Batch request is too large: {len(data)} bytes"
+                            )
+                            continue
+                        # The batch is full; the rest go into the next one
+                        await store.requeue(stage, job_ids[i:])
+                        break
+                    await asyncio.to_thread(f.write, data)
+                    size += len(data)
+                    included.append(job_id)
+            if not included:
+                continue
+            try:
+                name = await backend.submit(model, requests_path, display_name=f"panel-one-{stage}-{len(included)}")
+            except Exception as e:
+                # Back to the front of the queue for the next collection, unless
+                # the job has failed to submit too often; a batch that can never
+                # be submitted must not block the stage for good
+                failures = await store.count_submit_failure(stage, included)
+                retry = []
+                for job_id, count in zip(included, failures):
+                    if count >= settings.BULK_SUBMIT_MAX_ATTEMPTS:
+                        await _fail_taken_bulk_job(ctx, store, stage, job_id, f"Batch submission failed {count} times: {e}")
+                    else:
+                        retry.append(job_id)
+                await store.requeue(stage, retry)
+                raise
+            await store.add_batch(name, stage, included)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        logger.info("Submitted bulk batch", batch=name, stage=stage, num_jobs=len(included))
+        for job_id in included:
+            await update_job_status(ctx, job_id, status)
+            await record_job_progress(ctx, job_id, f"Waiting for {stage} batch")
+
+async def collect_bulk_batches(ctx):
+    """
+    Cron: puts pending bulk jobs into story and image batches.
+    """
+    store = BulkJobStore(ctx['redis'])
+    if not await store.lock_collector():
+        logger.info("Bulk collection already running, skipping")
+        return
+    try:
+        prompts = {
+            "story": Path("story_prompt.md").read_text(encoding="utf-8"),
+            "imagegen": Path("imagegen_prompt.md").read_text(encoding="utf-8"),
+        }
+        for stage in STAGES:
+            # Jobs a previous collection took but never got into a batch
+            recovered = await store.recover_inflight(stage)
+            if recovered:
+                logger.warning("Requeued bulk jobs left in flight", stage=stage, num_jobs=recovered)
+            await _submit_bulk_stage(ctx, store, stage, prompts)
+    finally:
+        await store.unlock_collector()
+
+async def _fan_out_result(ctx, store: BulkJobStore, stage: str, job_id: str, line: Optional[dict]):
+    if line is None:
+        raise ValueError("Missing from batch results")
+    if line.get("error"):
+        raise ValueError(f"Batch request failed: {line['error'].get('message', line['error'])}")
+    response = line.get("response") or {}
+
+    if stage == "story":
+        story_text = response_text(response)
+        if not story_text:
+            raise ValueError("No story text in response")
+        if await store.set_story(job_id, story_text):
+            await record_job_progress(ctx, job_id, "Story ready, waiting for image batch")
+        return
+
+    image_bytes = response_image(response)
+    if not image_bytes:
+        raise ValueError("No image data found in response")
+    await update_job_status(ctx, job_id, JobStatus.UPLOADING)
+    result_url, derivative_urls = await _publish_result(job_id, image_bytes)
+    await update_job_status(ctx, job_id, JobStatus.COMPLETED, result_url, derivative_urls=derivative_urls)
+    await store.finish_job(job_id)
+
+async def _poll_bulk_batch(ctx, store: BulkJobStore, name: str):
+    batch = await store.get_batch(name)
+    if batch is None:
+        await store.finish_batch(name)
+        return
+    backend = ctx['batch_backend']
+    try:
+        lines = await backend.poll(name)
+    except BatchFailed as e:
+        logger.error("Bulk batch failed", batch=name, error=str(e))
+        for job_id in batch["job_ids"]:
+            await update_job_status(ctx, job_id, JobStatus.FAILED, error_message=str(e))
+            await store.finish_job(job_id)
+        await store.finish_batch(name)
+        return
+    if lines is None:
+        await ctx['events'].refresh(batch["job_ids"], BULK_JOB_TTL_SECONDS)
+        return
+
+    results = {line.get("key"): line for line in lines}
+    events: RedisJobEventLog = ctx['events']
+    failed = 0
+    for job_id in batch["job_ids"]:
+        # A re-polled batch skips jobs it already finished
+        snapshot = await events.snapshot(job_id)
+        if snapshot and snapshot.status in TERMINAL_STATUSES:
+            continue
+        try:
+            await _fan_out_result(ctx, store, batch["stage"], job_id, results.get(job_id))
+        except Exception as e:
+            failed += 1
+            logger.warning("Bulk job failed", job_id=job_id, batch=name, error=str(e))
+            await update_job_status(ctx, job_id, JobStatus.FAILED, error_message=str(e))
+            await store.finish_job(job_id)
+
+    logger.info(
+        "Bulk batch finished",
+        batch=name,
+        stage=batch["stage"],
+        num_jobs=len(batch["job_ids"]),
+        failed=failed,
+        seconds=round(time.time() - batch["submitted_at"], 1),
+    )
+    await store.finish_batch(name)
+    await backend.discard(name)
+
+async def poll_bulk_batches(ctx):
+    """
+    Cron: checks every submitted batch and fans out the finished ones.
+    """
+    store = BulkJobStore(ctx['redis'])
+    for name in await store.batches():
+        if not await store.lock_batch(name):
+            continue
+        try:
+            await _poll_bulk_batch(ctx, store, name)
+        except Exception as e:
+            logger.error("Failed to poll bulk batch", batch=name, error=str(e))
+        finally:
+            await store.unlock_batch(name)
+
 class WorkerSettings:
     functions = [generate_panel]
+    cron_jobs = [
+        cron(
+            collect_bulk_batches,
+            minute=set(range(0, 60, settings.BULK_COLLECT_INTERVAL_MINUTES)),
+            second=0,
+            timeout=BULK_CRON_TIMEOUT,
+        ),
+        cron(poll_bulk_batches, second=30, timeout=BULK_CRON_TIMEOUT),
+    ]
     on_startup = startup
     on_shutdown = shutdown
     redis_settings = RedisSettings.from_dsn(settings.REDIS_URL)
     # Job timeout 590s
-    job_timeout = 590
+    job_timeout = JOB_TIMEOUT
@@ -9,13 +9,13 @@ import { Toaster } from "sonner";
 import { motion, AnimatePresence } from "framer-motion";
 
 export default function Home() {
-  const { status, resultUrl, error, startJob, reset } = usePanelGenerator();
+  const { status, resultUrl, previewUrl, derivativeUrls, error, startJob, reset } = usePanelGenerator();
 
   // Determine current view
   const renderContent = () => {
     if (status === "COMPLETED" && resultUrl) {
       return (
-        <ResultView resultUrl={resultUrl} onRestart={reset} />
+        <ResultView resultUrl={resultUrl} derivativeUrls={derivativeUrls} onRestart={reset} />
       );
     }
 
@@ -26,7 +26,7 @@ export default function Home() {
     }
 
     if (status) {
-      return <ProgressTimeline status={status} />;
+      return <ProgressTimeline status={status} previewUrl={previewUrl} />;
     }
 
     return (
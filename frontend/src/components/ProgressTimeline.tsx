@@ -7,6 +7,7 @@ import { JobStatus } from "../types";
 
 interface ProgressTimelineProps {
     status: JobStatus;
+    previewUrl?: string | null;
 }
 
 const STEPS: { id: JobStatus; label: string }[] = [
@@ -17,7 +18,7 @@ const STEPS: { id: JobStatus; label: string }[] = [
     { id: "UPLOADING", label: "Finalizando..." },
 ];
 
-export function ProgressTimeline({ status }: ProgressTimelineProps) {
+export function ProgressTimeline({ status, previewUrl }: ProgressTimelineProps) {
     const currentIndex = STEPS.findIndex((s) => s.id === status);
     // If status is not in STEPS (e.g. COMPLETED or FAILED), handle gracefully
     // COMPLETED means all done. FAILED means stopped.
@@ -74,6 +75,20 @@ export function ProgressTimeline({ status }: ProgressTimelineProps) {
                     );
                 })}
             </div>
+
+            {previewUrl && (
+                <motion.div
+                    initial={{ opacity: 0 }}
+                    animate={{ opacity: 1 }}
+                    className="mt-8 aspect-video w-full rounded-xl overflow-hidden border border-zinc-200 bg-white"
+                >
+                    <img
+                        src={previewUrl}
+                        alt="Vista previa del panel"
+                        className="w-full h-full object-contain"
+                    />
+                </motion.div>
+            )}
         </div>
     );
 }
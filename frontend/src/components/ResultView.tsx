@@ -5,10 +5,11 @@ import { Download, RotateCcw } from "lucide-react";
 
 interface ResultViewProps {
     resultUrl: string;
+    derivativeUrls?: Record<string, string> | null;
     onRestart: () => void;
 }
 
-export function ResultView({ resultUrl, onRestart }: ResultViewProps) {
+export function ResultView({ resultUrl, derivativeUrls, onRestart }: ResultViewProps) {
     const handleDownload = async () => {
         try {
             const response = await fetch(`/api/proxy-image?url=${encodeURIComponent(resultUrl)}`);
@@ -37,11 +38,16 @@ export function ResultView({ resultUrl, onRestart }: ResultViewProps) {
             className="w-full max-w-4xl mx-auto space-y-6"
         >
             <div className="relative aspect-video w-full rounded-2xl overflow-hidden shadow-2xl bg-white border border-zinc-200">
-                <img
-                    src={resultUrl}
-                    alt="Generated Comic Panel"
-                    className="w-full h-full object-contain" // Contain to ensure full image visible within 16:9
-                />
+                {/* Display the compressed variants; the PNG stays the download */}
+                <picture>
+                    {derivativeUrls?.avif && <source srcSet={derivativeUrls.avif} type="image/avif" />}
+                    {derivativeUrls?.webp && <source srcSet={derivativeUrls.webp} type="image/webp" />}
+                    <img
+                        src={resultUrl}
+                        alt="Generated Comic Panel"
+                        className="w-full h-full object-contain" // Contain to ensure full image visible within 16:9
+                    />
+                </picture>
             </div>
 
             <div className="flex flex-col sm:flex-row gap-4 justify-center">
@@ -29,6 +29,8 @@ export function usePanelGenerator() {
     const [status, setStatus] = useState<JobStatus | null>(null);
     const [jobId, setJobId] = useState<string | null>(null);
     const [resultUrl, setResultUrl] = useState<string | null>(null);
+    const [previewUrl, setPreviewUrl] = useState<string | null>(null);
+    const [derivativeUrls, setDerivativeUrls] = useState<Record<string, string> | null>(null);
     const [error, setError] = useState<string | null>(null);
     const wsRef = useRef<WebSocket | null>(null);
     const pollIntervalRef = useRef<NodeJS.Timeout | null>(null);
@@ -48,6 +50,8 @@ export function usePanelGenerator() {
         setJobId(null);
         setStatus(null);
         setResultUrl(null);
+        setPreviewUrl(null);
+        setDerivativeUrls(null);
         setError(null);
         if (wsRef.current) {
             wsRef.current.close();
@@ -83,6 +87,8 @@ export function usePanelGenerator() {
     const handleStateUpdate = (data: JobResponse) => {
         setStatus(data.status);
         if (data.result_url) setResultUrl(data.result_url);
+        if (data.preview_url) setPreviewUrl(data.preview_url);
+        if (data.derivative_urls) setDerivativeUrls(data.derivative_urls);
         if (data.error_message) setError(data.error_message);
 
         if (data.status === "COMPLETED" || data.status === "FAILED") {
@@ -157,6 +163,8 @@ export function usePanelGenerator() {
             setStatus("QUEUED"); // Optimistic update
             const formData = new FormData();
             files.forEach((file) => formData.append("images", file));
+            // Interactive users get a quick low-resolution preview before the final panel
+            formData.append("preview", "true");
 
             const res = await fetch(`${API_URL}/generate`, {
                 method: "POST",
@@ -180,6 +188,8 @@ export function usePanelGenerator() {
     return {
         status,
         resultUrl,
+        previewUrl,
+        derivativeUrls,
         error,
         startJob,
         reset: clearSession,
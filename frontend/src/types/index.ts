@@ -11,5 +11,8 @@ export interface JobResponse {
     job_id: string;
     status: JobStatus;
     result_url: string | null;
+    preview_url: string | null;
+    // Size-optimized variants of the result: webp, avif, thumbnail, social
+    derivative_urls: Record<string, string> | null;
     error_message: string | null;
 }
@@ -0,0 +1,310 @@
+import asyncio
+import io
+import json
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+from google import genai
+from PIL import Image
+from rich.console import Console
+from rich.progress import BarColumn, MofNCompleteColumn, Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
+from rich.table import Table
+
+from main import (
+    API_KEY,
+    IMAGE_MODEL,
+    STORY_MODEL,
+    extract_image_bytes,
+    image_generation_config,
+    load_prompts,
+    validate_images,
+)
+from scanner import ScanCache, watch_albums
+
+app = typer.Typer()
+console = Console()
+
+JOURNAL_NAME = ".panel_one_batch.jsonl"
+RESULT_NAME = "panel_one_result.png"
+
+
+def discover_albums(root: Path) -> List[Path]:
+    """
+    Every immediate subdirectory of the root is an album.
+    """
+    return sorted(d for d in root.iterdir() if d.is_dir() and not d.name.startswith("."))
+
+
+def read_manifest(manifest: Path) -> List[Path]:
+    """
+    One album directory per line; blank lines and '#' comments are ignored.
+    Relative paths are resolved against the manifest's directory.
+    """
+    albums = []
+    for line in manifest.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        path = Path(line)
+        albums.append(path if path.is_absolute() else manifest.parent / path)
+    return albums
+
+
+class Journal:
+    """
+    Append-only JSONL record of finished albums, so reruns skip them.
+    Only completed albums are skipped; failed ones are retried.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.completed = set()
+        if path.exists():
+            for line in path.read_text(encoding="utf-8").splitlines():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from an interrupted run
+                    continue
+                if record.get("status") == "completed":
+                    self.completed.add(record["album"])
+        self._file = open(path, "a", encoding="utf-8")
+
+    def is_completed(self, album: Path) -> bool:
+        return str(album.resolve()) in self.completed
+
+    def record(self, album: Path, status: str, **fields):
+        record = {"album": str(album.resolve()), "status": status, "ts": time.time(), **fields}
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+@dataclass
+class BatchStats:
+    total: int = 0
+    skipped: int = 0
+    completed: int = 0
+    failed: int = 0
+    story_seconds: List[float] = field(default_factory=list)
+    image_seconds: List[float] = field(default_factory=list)
+    failures: List[tuple] = field(default_factory=list)
+
+
+async def process_album(
+    client: genai.Client,
+    album: Path,
+    story_prompt_text: str,
+    imagegen_prompt_text: str,
+    story_semaphore: asyncio.Semaphore,
+    image_semaphore: asyncio.Semaphore,
+    stats: BatchStats,
+    cache: ScanCache,
+):
+    images = await asyncio.to_thread(validate_images, album, cache)
+    if not images:
+        raise ValueError("No valid images found in directory")
+
+    async with story_semaphore:
+        started = time.monotonic()
+        response_story = await client.aio.models.generate_content(
+            model=STORY_MODEL,
+            contents=[story_prompt_text] + images
+        )
+        stats.story_seconds.append(time.monotonic() - started)
+    story_text = response_story.text
+    await asyncio.to_thread((album / "story.txt").write_text, story_text, encoding="utf-8")
+
+    combined_text = f"{imagegen_prompt_text}\n\nCONTEXT (STORY):\n{story_text}"
+    async with image_semaphore:
+        started = time.monotonic()
+        response_image = await client.aio.models.generate_content(
+            model=IMAGE_MODEL,
+            contents=[combined_text] + images,
+            config=image_generation_config()
+        )
+        stats.image_seconds.append(time.monotonic() - started)
+
+    generated_image_bytes = extract_image_bytes(response_image)
+    if not generated_image_bytes:
+        raise ValueError("No image data found in response")
+
+    def _save():
+        Image.open(io.BytesIO(generated_image_bytes)).save(album / RESULT_NAME)
+
+    await asyncio.to_thread(_save)
+
+
+async def run_batch(
+    albums: List[Path],
+    journal: Journal,
+    story_concurrency: int,
+    image_concurrency: int,
+    watch_root: Optional[Path] = None,
+) -> BatchStats:
+    client = genai.Client(api_key=API_KEY)
+    story_prompt_text, imagegen_prompt_text = load_prompts()
+    story_semaphore = asyncio.Semaphore(story_concurrency)
+    image_semaphore = asyncio.Semaphore(image_concurrency)
+    stats = BatchStats(total=len(albums))
+    cache = ScanCache()
+
+    pending = []
+    for album in albums:
+        if journal.is_completed(album):
+            stats.skipped += 1
+        else:
+            pending.append(album)
+
+    # A fixed pool of album workers keeps memory bounded: only as many albums
+    # as can be in a model call are loaded at once.
+    num_workers = story_concurrency + image_concurrency
+    queue: asyncio.Queue = asyncio.Queue(maxsize=num_workers)
+
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        TimeElapsedColumn(),
+        console=console
+    ) as progress:
+        task = progress.add_task(
+            "Watching for albums..." if watch_root else "Processing albums...",
+            total=None if watch_root else len(pending),
+        )
+
+        async def _produce():
+            for album in pending:
+                await queue.put(album)
+            if watch_root:
+                # Albums already on disk were handled above; only new ones from here on
+                known = set(albums)
+                async for album in watch_albums(watch_root, skip=lambda a: a in known or journal.is_completed(a)):
+                    stats.total += 1
+                    await queue.put(album)
+            for _ in range(num_workers):
+                await queue.put(None)
+
+        async def _worker():
+            while True:
+                album = await queue.get()
+                if album is None:
+                    return
+                started = time.monotonic()
+                try:
+                    await process_album(
+                        client, album, story_prompt_text, imagegen_prompt_text,
+                        story_semaphore, image_semaphore, stats, cache,
+                    )
+                    stats.completed += 1
+                    journal.record(album, "completed", seconds=round(time.monotonic() - started, 2))
+                except Exception as e:
+                    stats.failed += 1
+                    stats.failures.append((album, str(e)))
+                    journal.record(album, "failed", error=str(e))
+                    progress.console.print(f"[red]{album}: {e}[/red]")
+                progress.advance(task)
+
+        workers = [asyncio.create_task(_worker()) for _ in range(num_workers)]
+        try:
+            await asyncio.gather(_produce(), *workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            cache.save()
+
+    return stats
+
+
+def print_summary(stats: BatchStats, elapsed: float):
+    table = Table(title="Batch summary")
+    table.add_column("Metric")
+    table.add_column("Value", justify="right")
+    table.add_row("Albums", str(stats.total))
+    table.add_row("Skipped (already done)", str(stats.skipped))
+    table.add_row("Completed", str(stats.completed))
+    table.add_row("Failed", str(stats.failed))
+    table.add_row("Elapsed", f"{elapsed:.1f}s")
+    processed = stats.completed + stats.failed
+    throughput = processed / elapsed * 60 if elapsed > 0 else 0.0
+    table.add_row("Throughput", f"{throughput:.1f} albums/min")
+    if stats.story_seconds:
+        table.add_row("Mean story call", f"{sum(stats.story_seconds) / len(stats.story_seconds):.1f}s")
+    if stats.image_seconds:
+        table.add_row("Mean image call", f"{sum(stats.image_seconds) / len(stats.image_seconds):.1f}s")
+    console.print(table)
+
+    for album, error in stats.failures[:20]:
+        console.print(f"[red]FAILED[/red] {album}: {error}")
+    if len(stats.failures) > 20:
+        console.print(f"... and {len(stats.failures) - 20} more failures (see journal)")
+
+
+@app.command()
+def main(
+    root: Optional[Path] = typer.Option(None, "--root", help="Directory whose subdirectories are albums"),
+    manifest: Optional[Path] = typer.Option(None, "--manifest", help="File listing one album directory per line"),
+    story_concurrency: int = typer.Option(8, "--story-concurrency", help="Maximum concurrent story calls"),
+    image_concurrency: int = typer.Option(4, "--image-concurrency", help="Maximum concurrent image calls"),
+    journal_path: Optional[Path] = typer.Option(None, "--journal", help="Progress journal (defaults to the root or manifest directory)"),
+    watch: bool = typer.Option(False, "--watch", help="Keep running and process new albums as they appear under --root"),
+):
+    """
+    Panel One Batch Script: generates panels for many albums concurrently.
+    """
+    if bool(root) == bool(manifest):
+        console.print("[red]Error: pass exactly one of --root or --manifest.[/red]")
+        raise typer.Exit(code=1)
+
+    if watch and not root:
+        console.print("[red]Error: --watch requires --root.[/red]")
+        raise typer.Exit(code=1)
+
+    if not API_KEY:
+        console.print("[red]Error: GEMINI_API_KEY not found in environment.[/red]")
+        raise typer.Exit(code=1)
+
+    if root:
+        if not root.is_dir():
+            console.print(f"[red]Error: Directory {root} does not exist.[/red]")
+            raise typer.Exit(code=1)
+        albums = discover_albums(root)
+        default_journal = root / JOURNAL_NAME
+    else:
+        if not manifest.is_file():
+            console.print(f"[red]Error: Manifest {manifest} does not exist.[/red]")
+            raise typer.Exit(code=1)
+        albums = read_manifest(manifest)
+        default_journal = manifest.parent / JOURNAL_NAME
+
+    missing = [a for a in albums if not a.is_dir()]
+    for album in missing:
+        console.print(f"[yellow]Warning: {album} is not a directory, skipping.[/yellow]")
+    albums = [a for a in albums if a.is_dir()]
+
+    journal = Journal(journal_path or default_journal)
+    started = time.monotonic()
+    try:
+        stats = asyncio.run(run_batch(
+            albums, journal, story_concurrency, image_concurrency,
+            watch_root=root if watch else None,
+        ))
+    except KeyboardInterrupt:
+        console.print("[yellow]Stopped.[/yellow]")
+        raise typer.Exit(code=0)
+    finally:
+        journal.close()
+
+    print_summary(stats, time.monotonic() - started)
+    if stats.failed:
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    app()
@@ -10,6 +10,8 @@ from google import genai
 from google.genai import types
 from PIL import Image
 
+from scanner import MAX_IMAGES, ScanCache, iter_images
+
 # Initialize Typer and Rich
 app = typer.Typer()
 console = Console()
@@ -21,34 +23,81 @@ load_dotenv(dotenv_path=env_path, override=True)
 
 API_KEY = os.getenv("GEMINI_API_KEY")
 
-def validate_images(directory: Path) -> List[Image.Image]:
+STORY_MODEL = "gemini-3-pro-preview"
+IMAGE_MODEL = "gemini-3-pro-image-preview"
+
+SCRIPT_DIR = Path(__file__).parent
+
+def validate_images(directory: Path, cache: ScanCache | None = None) -> List[Image.Image]:
     """
     Scans the directory for images, validates them with Pillow, 
     and returns a list of up to 8 PIL Image objects.
     """
+    def _warn(path: Path, error: str):
+        console.print(f"[yellow]Warning: Could not open {path.name}: {error}, skipping.[/yellow]")
+
+    # Headers are sniffed in parallel and the scan stops once 8 images have
+    # decoded, so only the images actually used are decoded. A file with a
+    # good header can still be truncated; it is skipped and the scan goes on.
     valid_images = []
-    # Scan for images
-    extensions = {'.jpg', '.jpeg', '.png', '.webp'}
-    files = sorted([f for f in directory.iterdir() if f.is_file() and f.suffix.lower() in extensions])
-    
-    for f in files:
+    for f in iter_images(directory, cache=cache, on_invalid=_warn):
         try:
-            # Open and verify
-            with Image.open(f) as img:
-                img.verify()
-            
-            # Re-open to return the object (verify closes the file)
-            # We need to keep the file open or load it into memory. 
             # Loading into memory is safer to avoid "closed file" errors when passing to SDK.
             img = Image.open(f)
             img.load() 
-            valid_images.append(img)
         except Exception as e:
-            console.print(f"[yellow]Warning: Could not open {f.name}: {e}, skipping.[/yellow]")
+            _warn(f, str(e))
+            try:
+                # Remember it, so later scans skip the file without decoding it
+                if cache:
+                    cache.put(f, f.stat(), str(e))
+            except OSError:
+                pass
             continue
-            
-    # Limit to 8 images
-    return valid_images[:8]
+        valid_images.append(img)
+        if len(valid_images) == MAX_IMAGES:
+            break
+
+    return valid_images
+
+def load_prompts() -> tuple[str, str]:
+    """
+    Reads the story and image generation prompts from the script directory.
+    Exits with an error if either is missing.
+    """
+    story_prompt_path = SCRIPT_DIR / "story_prompt.md"
+    imagegen_prompt_path = SCRIPT_DIR / "imagegen_prompt.md"
+
+    if not story_prompt_path.exists():
+         console.print(f"[red]Error: {story_prompt_path} not found.[/red]")
+         raise typer.Exit(code=1)
+    if not imagegen_prompt_path.exists():
+         console.print(f"[red]Error: {imagegen_prompt_path} not found.[/red]")
+         raise typer.Exit(code=1)
+
+    return (
+        story_prompt_path.read_text(encoding="utf-8"),
+        imagegen_prompt_path.read_text(encoding="utf-8"),
+    )
+
+def image_generation_config() -> types.GenerateContentConfig:
+    return types.GenerateContentConfig(
+        image_config=types.ImageConfig(
+            aspect_ratio="16:9",
+            image_size="2K"
+        )
+    )
+
+def extract_image_bytes(response_image) -> bytes | None:
+    """
+    Returns the first inline image in a generate_content response, if any.
+    """
+    # The SDK v1 usually returns the image data in the response candidates
+    if response_image.candidates and response_image.candidates[0].content.parts:
+        for part in response_image.candidates[0].content.parts:
+            if part.inline_data:
+                return part.inline_data.data
+    return None
 
 @app.command()
 def main(directory: Path = typer.Option(..., "--dir", help="Directory containing images")):
@@ -65,20 +114,7 @@ def main(directory: Path = typer.Option(..., "--dir", help="Directory containing
 
     client = genai.Client(api_key=API_KEY)
 
-    # Paths to prompts (assuming they are in the script directory)
-    script_dir = Path(__file__).parent
-    story_prompt_path = script_dir / "story_prompt.md"
-    imagegen_prompt_path = script_dir / "imagegen_prompt.md"
-
-    if not story_prompt_path.exists():
-         console.print(f"[red]Error: {story_prompt_path} not found.[/red]")
-         raise typer.Exit(code=1)
-    if not imagegen_prompt_path.exists():
-         console.print(f"[red]Error: {imagegen_prompt_path} not found.[/red]")
-         raise typer.Exit(code=1)
-
-    story_prompt_text = story_prompt_path.read_text(encoding="utf-8")
-    imagegen_prompt_text = imagegen_prompt_path.read_text(encoding="utf-8")
+    story_prompt_text, imagegen_prompt_text = load_prompts()
 
     with Progress(
         SpinnerColumn(),
@@ -88,7 +124,9 @@ def main(directory: Path = typer.Option(..., "--dir", help="Directory containing
         
         # Step 1: Process Images
         task_imgs = progress.add_task("Processing images...", total=None)
-        images = validate_images(directory)
+        cache = ScanCache()
+        images = validate_images(directory, cache)
+        cache.save()
         if not images:
              console.print("[red]No valid images found in directory.[/red]")
              raise typer.Exit(code=1)
@@ -102,7 +140,7 @@ def main(directory: Path = typer.Option(..., "--dir", help="Directory containing
         
         try:
             response_story = client.models.generate_content(
-                model="gemini-3-pro-preview",
+                model=STORY_MODEL,
                 contents=contents_story
             )
             story_text = response_story.text
@@ -119,30 +157,14 @@ def main(directory: Path = typer.Option(..., "--dir", help="Directory containing
         combined_text = f"{imagegen_prompt_text}\n\nCONTEXT (STORY):\n{story_text}"
         contents_image = [combined_text] + images
         
-        image_config = types.ImageConfig(
-            aspect_ratio="16:9",
-            image_size="2K"
-        )
-
         try:
             response_image = client.models.generate_content(
-                model="gemini-3-pro-image-preview",
+                model=IMAGE_MODEL,
                 contents=contents_image,
-                config=types.GenerateContentConfig(
-                    image_config=image_config
-                )
+                config=image_generation_config()
             )
             
-            # Extract image
-            # The SDK v1 usually returns the image data in the response candidates
-            generated_image_bytes = None
-            
-            # Check if we have candidates and parts
-            if response_image.candidates and response_image.candidates[0].content.parts:
-                for part in response_image.candidates[0].content.parts:
-                    if part.inline_data:
-                        generated_image_bytes = part.inline_data.data
-                        break
+            generated_image_bytes = extract_image_bytes(response_image)
             
             if generated_image_bytes:
                 img_out = Image.open(io.BytesIO(generated_image_bytes))
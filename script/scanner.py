@@ -0,0 +1,177 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterator, List, Optional
+
+from PIL import Image
+
+# Shared by the backend client (backend/scanner.py) and the script
+# (script/scanner.py); keep both copies identical. backend/deploy.sh
+# refuses to deploy when they differ.
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+MAX_IMAGES = 8
+DEFAULT_CACHE_PATH = Path.home() / ".cache" / "panel-one" / "scan_cache.json"
+
+
+def sniff_image(path: Path) -> Optional[str]:
+    """
+    Checks that a file is a readable image by parsing only its header.
+    Returns None if it is valid, or the reason it is not.
+    """
+    try:
+        # Image.open reads the header lazily; no pixel data is decoded
+        with Image.open(path) as img:
+            width, height = img.size
+            if not width or not height:
+                return "Image has no dimensions"
+    except Exception as e:
+        return str(e)
+    return None
+
+
+class ScanCache:
+    """
+    Validation results keyed by path, invalidated when mtime or size change.
+    Safe to share between threads; call save() to persist.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH):
+        self.path = path
+        self._entries = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        try:
+            self._entries = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def get(self, path: Path, stat: os.stat_result):
+        """
+        Returns (hit, error) for a cached result matching the file's mtime and size.
+        """
+        entry = self._entries.get(str(path))
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return True, entry[2]
+        return False, None
+
+    def put(self, path: Path, stat: os.stat_result, error: Optional[str]):
+        with self._lock:
+            self._entries[str(path)] = [stat.st_mtime_ns, stat.st_size, error]
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+            tmp_path.write_text(json.dumps(self._entries), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+
+def _check(path: Path, cache: Optional[ScanCache]) -> Optional[str]:
+    try:
+        stat = path.stat()
+    except OSError as e:
+        return str(e)
+    if cache:
+        hit, error = cache.get(path, stat)
+        if hit:
+            return error
+    error = sniff_image(path)
+    if cache:
+        cache.put(path, stat, error)
+    return error
+
+
+def iter_images(
+    directory: Path,
+    workers: int = 8,
+    cache: Optional[ScanCache] = None,
+    on_invalid: Optional[Callable[[Path, str], None]] = None,
+) -> Iterator[Path]:
+    """
+    Yields valid image paths from the directory, in name order.
+
+    Headers are sniffed `workers` files at a time, and only as far as the
+    caller consumes, so large folders are never read in full.
+    """
+    if not directory.exists():
+        return
+    files = sorted(
+        Path(entry.path) for entry in os.scandir(directory)
+        if entry.is_file() and Path(entry.name).suffix.lower() in IMAGE_EXTENSIONS
+    )
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(files), workers):
+            batch = files[start:start + workers]
+            for path, error in zip(batch, pool.map(lambda p: _check(p, cache), batch)):
+                if error is None:
+                    yield path
+                elif on_invalid:
+                    on_invalid(path, error)
+
+
+def scan_images(
+    directory: Path,
+    limit: int = MAX_IMAGES,
+    workers: int = 8,
+    cache: Optional[ScanCache] = None,
+    on_invalid: Optional[Callable[[Path, str], None]] = None,
+) -> List[Path]:
+    """
+    Returns up to `limit` valid image paths from the directory, in name order.
+    Scanning stops as soon as `limit` valid images are found.
+    """
+    valid = []
+    for path in iter_images(directory, workers=workers, cache=cache, on_invalid=on_invalid):
+        valid.append(path)
+        if len(valid) == limit:
+            break
+    return valid
+
+
+def _latest_mtime(directory: Path) -> float:
+    latest = directory.stat().st_mtime
+    for entry in os.scandir(directory):
+        latest = max(latest, entry.stat().st_mtime)
+    return latest
+
+
+async def watch_albums(
+    root: Path,
+    interval: float = 5.0,
+    settle: float = 10.0,
+    skip: Optional[Callable[[Path], bool]] = None,
+) -> AsyncIterator[Path]:
+    """
+    Yields album directories as they appear under `root`, forever.
+
+    Only the root listing is polled. A new album is read once per poll until
+    nothing in it has changed for `settle` seconds, so half-copied folders are
+    not picked up; after that it is yielded and never looked at again.
+    """
+    seen = set()
+    while True:
+        entries = await asyncio.to_thread(lambda: [Path(e.path) for e in os.scandir(root) if e.is_dir()])
+        for album in sorted(entries):
+            if album in seen or album.name.startswith("."):
+                continue
+            if skip and skip(album):
+                seen.add(album)
+                continue
+            try:
+                latest = await asyncio.to_thread(_latest_mtime, album)
+            except OSError:
+                continue
+            if time.time() - latest >= settle:
+                seen.add(album)
+                yield album
+        await asyncio.sleep(interval)